@@ -0,0 +1,291 @@
+"""Offline benchmarks for mobi.py, run against the recorded fixture pages.
+
+    python3 bench/bench.py [--repeat 20] [--output results.json] [--compare previous.json]
+
+Starts the stand-in server from server.py, points MobiClient at it and times
+cold start, login, page fetches, parsing and JSON serialization. Results are
+written as JSON (to stdout unless --output is given) so runs can be compared;
+a short summary goes to stderr. The schedule parser is also checked against
+a pinned copy of the original BeautifulSoup implementation when bs4 is
+installed.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, PLUGIN_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import mobi
+from server import FIXTURES_DIR, start_server
+
+PLAN_FIXTURES = ['planlekcji.html', 'planlekcji_zmiany.html']
+CALENDAR_FIXTURES = ['kalendarzklasowy.html', 'kalendarzklasowy_bledy.html']
+
+# What the calendar fixtures hold: kalendarzklasowy_bledy.html has 150
+# events, one of them malformed (a function value), which is skipped
+CALENDAR_EXPECTED = {
+    'kalendarzklasowy': {
+        'events': 150,
+        'event_types': {'ceremony': 19, 'dictation': 23, 'grades': 12, 'holiday': 19,
+                        'meeting': 20, 'other': 17, 'quiz': 17, 'test': 23},
+        'title': 'Kartkówka: Język angielski',
+    },
+    'kalendarzklasowy_bledy': {
+        'events': 149,
+        'event_types': {'ceremony': 29, 'dictation': 16, 'grades': 20, 'holiday': 20,
+                        'meeting': 13, 'other': 13, 'quiz': 20, 'test': 18},
+        'title': 'Dzień wolny od zajęć',
+    },
+}
+
+USERNAME = 'uczen'
+PASSWORD = 'haslo'
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+def measure(fn: Callable[[], object], repeat: int, number: int = 1) -> dict:
+    """Time fn; each of the repeat samples runs it number times and reports the per-call time"""
+    fn()  # warm-up
+    samples = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1000)
+
+    samples.sort()
+    return {
+        'runs': repeat,
+        'calls_per_run': number,
+        'min_ms': round(samples[0], 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+    }
+
+def reference_parse_schedule(client: mobi.MobiClient, html_content: str) -> Dict[str, List[mobi.Lesson]]:
+    """The original BeautifulSoup-based get_schedule parsing, pinned for comparison"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    schedule_cnt = soup.find('div', class_='plansc_cnt')
+
+    if not schedule_cnt:
+        raise Exception("Unable to find schedule content")
+
+    schedule = {day: [] for day in client.WEEKDAYS}
+
+    for div in schedule_cnt.find_all('div', class_='plansc_cnt_w'):
+        first_div = div.find('div', recursive=False)
+        if not first_div:
+            continue
+
+        style = first_div.get('style', '')
+        left_value = next(
+            (prop.replace('left:', '').strip()
+             for prop in style.split(';')
+             if prop.strip().startswith('left:')),
+            None
+        )
+
+        if not left_value:
+            continue
+
+        try:
+            lesson = client._parse_lesson_title(first_div.get('title', ''), left_value)
+            weekday = client._get_weekday(left_value)
+            lesson.weekday = weekday
+            schedule[weekday].append(lesson)
+        except Exception:
+            continue
+
+    for day in schedule:
+        schedule[day].sort(key=lambda x: x.id)
+
+    return schedule
+
+def lesson_titles(client: mobi.MobiClient) -> List[tuple]:
+    """(title, left) pairs of every parseable lesson cell in the plan fixtures"""
+    pairs = []
+    for name in PLAN_FIXTURES:
+        for attrs in mobi._ScheduleScanner.scan(read_fixture(name)) or []:
+            if not attrs or 'left:' not in attrs.get('style', ''):
+                continue
+
+            left = attrs['style'].split('left:')[1].split(';')[0].strip()
+            try:
+                client._parse_lesson_title(attrs.get('title', ''), left)
+            except Exception:
+                continue
+            pairs.append((attrs.get('title', ''), left))
+    return pairs
+
+def run_python(code: str) -> None:
+    subprocess.run([sys.executable, '-c', code], cwd=PLUGIN_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def run_benchmarks(repeat: int) -> dict:
+    results = {}
+    checks = {}
+    server, base_url = start_server()
+
+    def new_client(**kwargs) -> mobi.MobiClient:
+        return mobi.MobiClient(USERNAME, PASSWORD, base_url=base_url, **kwargs)
+
+    # Interpreter start + import, and a full one-shot CLI call
+    cold_repeat = max(3, repeat // 4)
+    results['cold_start_import'] = measure(lambda: run_python('import mobi'), cold_repeat)
+    results['cold_start_cli_schedule'] = measure(
+        lambda: subprocess.run(
+            [sys.executable, 'mobi.py', '-u', USERNAME, '-p', PASSWORD,
+             '--base-url', base_url, '--schedule'],
+            cwd=PLUGIN_DIR, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ),
+        cold_repeat
+    )
+
+    # Network paths against the stand-in server
+    results['login'] = measure(lambda: new_client().login(), repeat)
+
+    client = new_client()
+    client.login()
+    results['fetch_schedule'] = measure(client.get_schedule, repeat)
+    results['fetch_calendar'] = measure(client.get_calendar_events, repeat)
+    results['fetch_both'] = measure(lambda: mobi.fetch(client, True, True), repeat)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cached = new_client(cache_dir=cache_dir)
+        cached.get_schedule()
+        results['fetch_schedule_cached'] = measure(cached.get_schedule, repeat, number=10)
+
+    # Parsing
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        for name in PLAN_FIXTURES:
+            html = read_fixture(name)
+            key = name.rsplit('.', 1)[0]
+            results[f'parse_schedule[{key}]'] = measure(lambda: client._parse_schedule(html), repeat)
+
+            try:
+                import bs4  # noqa: F401
+            except ImportError:
+                checks[f'schedule_matches_reference[{key}]'] = None
+                continue
+
+            results[f'parse_schedule_reference[{key}]'] = measure(
+                lambda: reference_parse_schedule(client, html), repeat
+            )
+            checks[f'schedule_matches_reference[{key}]'] = (
+                mobi.convert_schedule_to_dict(client._parse_schedule(html)) ==
+                mobi.convert_schedule_to_dict(reference_parse_schedule(client, html))
+            )
+
+        titles = lesson_titles(client)
+        results['parse_lesson_title'] = measure(
+            lambda: [client._parse_lesson_title(title, left) for title, left in titles],
+            repeat
+        )
+        results['parse_lesson_title']['titles'] = len(titles)
+
+        for name in CALENDAR_FIXTURES:
+            html = read_fixture(name)
+            key = name.rsplit('.', 1)[0]
+            results[f'extract_calendar_events[{key}]'] = measure(
+                lambda: client._extract_calendar_events(html), repeat
+            )
+            events = client._extract_calendar_events(html)
+            results[f'extract_calendar_events[{key}]']['events'] = len(events)
+            
+            expected = CALENDAR_EXPECTED[key]
+            event_types = {}
+            for event in events:
+                event_types[event.event_type] = event_types.get(event.event_type, 0) + 1
+            checks[f'calendar_event_count[{key}]'] = len(events) == expected['events']
+            checks[f'calendar_event_types[{key}]'] = event_types == expected['event_types']
+            checks[f'calendar_decoded_title[{key}]'] = any(event.title == expected['title'] for event in events)
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+
+    # Serialization of a full schedule + calendar result
+    result = mobi.fetch(client, True, True)
+    results['json_serialization'] = measure(lambda: json.dumps(result, ensure_ascii=False), repeat, number=10)
+    results['json_serialization']['bytes'] = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+    server.shutdown()
+    return {'results': results, 'checks': checks}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PLUGIN_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_summary(report: dict, previous: Optional[dict]) -> None:
+    previous_results = (previous or {}).get('results', {})
+
+    for name, stats in report['results'].items():
+        line = f"{name:48} {stats['median_ms']:10.3f} ms"
+        before = previous_results.get(name)
+        if before and before.get('median_ms'):
+            line += f"  ({stats['median_ms'] / before['median_ms']:.2f}x vs previous)"
+        print(line, file=sys.stderr)
+
+    for name, passed in report['checks'].items():
+        status = 'skipped (bs4 not installed)' if passed is None else ('ok' if passed else 'MISMATCH')
+        print(f"{name:48} {status}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mobi.py against recorded fixture pages")
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per benchmark')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Previous JSON results to compare medians against')
+
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        **run_benchmarks(args.repeat),
+    }
+
+    print_summary(report, previous)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if any(passed is False for passed in report['checks'].values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
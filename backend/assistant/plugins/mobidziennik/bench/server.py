@@ -0,0 +1,131 @@
+"""Local stand-in for the MobiDziennik server, serving the recorded fixture pages.
+
+Point mobi.py at it with --base-url (or MOBI_BASE_URL):
+
+    python3 bench/server.py --port 8765 &
+    python3 mobi.py -u uczen -p haslo --base-url http://127.0.0.1:8765/dziennik --schedule
+
+Any credentials log in except the password "zle", which gets the failed
+login page. Pages are only served with the session cookie; without it the
+login form is returned, like an expired session on the real server.
+"""
+import argparse
+import hashlib
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+SESSION_COOKIE = 'mobi_sesja'
+SESSION_ID = 'bench-session'
+BAD_PASSWORD = 'zle'
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves /dziennik (login), /dziennik/planlekcji and /dziennik/kalendarzklasowy"""
+
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment so keep-alive timings are not
+    # dominated by Nagle/delayed-ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body: bytes, status: int = 200, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+    def do_POST(self):
+        self._delay()
+        length = int(self.headers.get('Content-Length', 0))
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.server.logins += 1
+
+        if form.get('haslo', [''])[0] == BAD_PASSWORD:
+            self._send(read_fixture('login_failed.html'))
+            return
+
+        self._send(read_fixture('dziennik.html'), headers={
+            'Set-Cookie': f'{SESSION_COOKIE}={SESSION_ID}; Path=/; HttpOnly'
+        })
+
+    def do_GET(self):
+        self._delay()
+        path = urlparse(self.path).path.rstrip('/')
+
+        if f'{SESSION_COOKIE}={SESSION_ID}' not in self.headers.get('Cookie', ''):
+            self._send(read_fixture('login.html'))
+            return
+
+        pages = {
+            '/dziennik': 'dziennik.html',
+            '/dziennik/planlekcji': self.server.plan,
+            '/dziennik/kalendarzklasowy': self.server.calendar,
+        }
+        if path not in pages:
+            self._send(b'Not found', status=404)
+            return
+
+        body = read_fixture(pages[path])
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+
+        if self.server.etags and self.headers.get('If-None-Match') == etag:
+            self._send(b'', status=304, headers={'ETag': etag})
+            return
+
+        self._send(body, headers={'ETag': etag} if self.server.etags else None)
+
+def start_server(port: int = 0, plan: str = 'planlekcji.html',
+                 calendar: str = 'kalendarzklasowy.html', delay: float = 0.0,
+                 etags: bool = False) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stand-in server in a background thread; returns it and its base URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandInHandler)
+    server.daemon_threads = True
+    server.plan = plan
+    server.calendar = calendar
+    server.delay = delay
+    server.etags = etags
+    server.logins = 0
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/dziennik'
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the recorded MobiDziennik fixture pages")
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--plan', default='planlekcji.html', help='Fixture served as planlekcji')
+    parser.add_argument('--calendar', default='kalendarzklasowy.html', help='Fixture served as kalendarzklasowy')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds to wait before every response')
+    parser.add_argument('--etags', action='store_true', help='Send ETags and answer If-None-Match with 304')
+
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.plan, args.calendar, args.delay, args.etags)
+    print(f"Serving fixtures at {base_url}", flush=True)
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
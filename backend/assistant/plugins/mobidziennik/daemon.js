@@ -0,0 +1,173 @@
+import { spawn } from 'child_process';
+import dotenv from 'dotenv';
+import path from 'path';
+import { fileURLToPath } from 'url';
+
+dotenv.config();
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+const USERNAME = process.env.MOBI_USERNAME;
+const PASSWORD = process.env.MOBI_PASSWORD;
+
+// Single long-lived `mobi.py --serve` process shared by all callers
+let python = null;
+let nextId = 1;
+const pending = new Map();
+
+// Stderr lines kept for the error message when the daemon exits
+const STDERR_TAIL_LINES = 20;
+
+function rejectPending(error) {
+  for (const { reject } of pending.values()) {
+    reject(error);
+  }
+  pending.clear();
+}
+
+function startDaemon() {
+  const pythonScript = path.join(__dirname, 'mobi.py');
+
+  const child = spawn(process.platform === 'win32' ? 'python' : 'python3', [
+    pythonScript,
+    '-u', USERNAME,
+    '-p', PASSWORD,
+    '--serve'
+  ], {
+    encoding: 'utf-8'
+  });
+
+  let outputBuffer = '';
+  const stderrTail = [];
+
+  child.stdout.on('data', (data) => {
+    outputBuffer += data.toString('utf-8');
+
+    let newline;
+    while ((newline = outputBuffer.indexOf('\n')) !== -1) {
+      const line = outputBuffer.slice(0, newline).trim();
+      outputBuffer = outputBuffer.slice(newline + 1);
+      if (!line) continue;
+
+      let response;
+      try {
+        response = JSON.parse(line);
+      } catch (error) {
+        console.error('[mobi] Unparseable daemon output:', line);
+        continue;
+      }
+
+      const request = pending.get(response.id);
+      if (!request) continue;
+      pending.delete(response.id);
+
+      if (response.error) {
+        request.reject(new Error(response.error));
+      } else {
+        request.resolve(response);
+      }
+    }
+  });
+
+  let stderrBuffer = '';
+
+  const logStderr = (line) => {
+    // Per-request timings, printed when MOBI_PROFILE is set
+    if (line.startsWith('{"profile"')) {
+      try {
+        console.log('[mobi] Profile:', JSON.stringify(JSON.parse(line).profile));
+        return;
+      } catch {}
+    }
+
+    // Warnings (stale data, unparseable lessons, ...) as they happen
+    console.warn('[mobi]', line);
+    stderrTail.push(line);
+    if (stderrTail.length > STDERR_TAIL_LINES) {
+      stderrTail.shift();
+    }
+  };
+
+  child.stderr.on('data', (data) => {
+    stderrBuffer += data.toString('utf-8');
+
+    let newline;
+    while ((newline = stderrBuffer.indexOf('\n')) !== -1) {
+      const line = stderrBuffer.slice(0, newline).trimEnd();
+      stderrBuffer = stderrBuffer.slice(newline + 1);
+      if (line) logStderr(line);
+    }
+  });
+
+  child.on('close', (code) => {
+    if (python === child) {
+      python = null;
+    }
+
+    if (stderrBuffer.trim()) {
+      logStderr(stderrBuffer.trim());
+    }
+
+    let message = stderrTail.length ? `Python script failed: ${stderrTail.join('\n')}` : '';
+    try {
+      message = JSON.parse(stderrTail[stderrTail.length - 1]).error || message;
+    } catch {}
+    rejectPending(new Error(message || `mobi.py exited with code ${code}`));
+  });
+
+  child.on('error', (error) => {
+    if (python === child) {
+      python = null;
+    }
+    rejectPending(error);
+  });
+
+  // Writing a query after mobi.py has died fails with EPIPE; without a
+  // listener that error would take the whole assistant down
+  child.stdin.on('error', (error) => {
+    if (python === child) {
+      python = null;
+    }
+    rejectPending(error);
+  });
+
+  return child;
+}
+
+/**
+ * Send a command to the mobi.py daemon, starting it if needed
+ * @param {string} command - 'schedule', 'calendar' or 'both'
+ * @param {Object} filters - Optional filters applied by mobi.py before serialization
+ * @param {string} filters.day - 'today', 'tomorrow', 'dayaftertomorrow', a weekday name or 'YYYY-MM-DD'
+ * @param {string} filters.from - Only events on or after this date ('YYYY-MM-DD')
+ * @param {string} filters.to - Only events on or before this date ('YYYY-MM-DD')
+ * @param {string[]} filters.type - Only these event types
+ * @param {number} filters.limit - Return at most this many events
+ * @returns {Promise} Promise resolving to the daemon's response ({ schedule, events, total_events })
+ */
+export function query(command, filters = {}) {
+  if (!USERNAME || !PASSWORD) {
+    return Promise.reject(new Error('MOBI_USERNAME and MOBI_PASSWORD must be set in environment variables'));
+  }
+
+  if (!python) {
+    python = startDaemon();
+  }
+
+  return new Promise((resolve, reject) => {
+    const id = nextId++;
+    pending.set(id, { resolve, reject });
+    python.stdin.write(JSON.stringify({ ...filters, id, command }) + '\n');
+  });
+}
+
+/**
+ * Stop the daemon (it is restarted on the next query)
+ */
+export function stop() {
+  if (python) {
+    python.kill();
+    python = null;
+  }
+}
@@ -1,13 +1,8 @@
-import { spawn } from 'child_process';
 import dotenv from 'dotenv';
-import path from 'path';
-import { fileURLToPath } from 'url';
+import { query } from './daemon.js';
 
 dotenv.config();
 
-const __filename = fileURLToPath(import.meta.url);
-const __dirname = path.dirname(__filename);
-
 const USERNAME = process.env.MOBI_USERNAME;
 const PASSWORD = process.env.MOBI_PASSWORD;
 
@@ -53,56 +48,21 @@ export default {
       }
 
       const targetDateStr = targetDate.toISOString().split('T')[0];
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--calendar'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
-      
+      // mobi.py filters events to the target date
+      query('calendar', { day: targetDateStr }).then((fullData) => {
         try {
-          const fullData = JSON.parse(outputData);
-          const allEvents = fullData.events || [];
-          
-          // Filter events for the target date
-          const dayEvents = allEvents.filter(event => event.date === targetDateStr);
+          const dayEvents = fullData.events || [];
           
           resolve({
             date: targetDateStr,
             events: dayEvents,
-            totalEvents: allEvents.length
+            totalEvents: fullData.total_events ?? dayEvents.length
           });
       
         } catch (error) {
           reject(new Error(`Failed to parse events output: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -112,46 +72,13 @@ export default {
    */
   async getSchedule() {
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--schedule'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
-      
+      query('schedule').then((data) => {
         try {
-          const data = JSON.parse(outputData);
           resolve(data.schedule || {});
         } catch (error) {
           reject(new Error(`Failed to parse schedule output: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -163,41 +90,8 @@ export default {
    */
   async getLessons({ day = 'today' } = {}) {
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--schedule'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
-      
+      query('schedule').then((data) => {
         try {
-          const data = JSON.parse(outputData);
           const schedule = data.schedule || {};
           
           let targetWeekday;
@@ -261,7 +155,7 @@ export default {
         } catch (error) {
           reject(new Error(`Failed to parse schedule: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -273,98 +167,62 @@ export default {
    */
   async getDayData({ day = 'today' } = {}) {
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--schedule',
-        '--calendar'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
+      let targetDate = new Date();
+      let targetDateStr;
+      let targetWeekday;
       
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
+      // Parse day parameter
+      if (day.match(/^\d{4}-\d{2}-\d{2}$/)) {
+        targetDate = new Date(day);
+        if (isNaN(targetDate.getTime())) {
+          reject(new Error('Invalid date format. Use YYYY-MM-DD'));
           return;
         }
+        targetDateStr = day;
+      } else {
+        let daysToAdd = 0;
+        const dayMapping = {
+          'monday': 1, 'tuesday': 2, 'wednesday': 3, 'thursday': 4, 'friday': 5,
+          'poniedziałek': 1, 'wtorek': 2, 'środa': 3, 'czwartek': 4, 'piątek': 5
+        };
+        
+        if (dayMapping[day.toLowerCase()]) {
+          // Find next occurrence of this weekday
+          const today = new Date();
+          const todayWeekday = today.getDay(); // 0 = Sunday, 1 = Monday
+          const targetWeekdayNum = dayMapping[day.toLowerCase()];
+          daysToAdd = (targetWeekdayNum - todayWeekday + 7) % 7;
+          if (daysToAdd === 0 && day.toLowerCase() !== 'today') {
+            daysToAdd = 7; // Next week if it's the same day
+          }
+        } else {
+          switch (day.toLowerCase()) {
+            case 'tomorrow':
+              daysToAdd = 1;
+              break;
+            case 'today':
+              daysToAdd = 0;
+              break;
+            default:
+              reject(new Error('Invalid day parameter'));
+              return;
+          }
+        }
+        
+        targetDate.setDate(targetDate.getDate() + daysToAdd);
+        targetDateStr = targetDate.toISOString().split('T')[0];
+      }
+      
+      // Get weekday name in Polish
+      const weekdayIndex = targetDate.getDay();
+      const weekdays = ['niedziela', 'poniedziałek', 'wtorek', 'środa', 'czwartek', 'piątek', 'sobota'];
+      targetWeekday = weekdays[weekdayIndex];
       
+      // mobi.py filters events to the target date and lessons to its weekday
+      query('both', { day: targetDateStr }).then((data) => {
         try {
-          const data = JSON.parse(outputData);
           const schedule = data.schedule || {};
-          const allEvents = data.events || [];
-          
-          let targetDate = new Date();
-          let targetDateStr;
-          let targetWeekday;
-          
-          // Parse day parameter
-          if (day.match(/^\d{4}-\d{2}-\d{2}$/)) {
-            targetDate = new Date(day);
-            if (isNaN(targetDate.getTime())) {
-              reject(new Error('Invalid date format. Use YYYY-MM-DD'));
-              return;
-            }
-            targetDateStr = day;
-          } else {
-            let daysToAdd = 0;
-            const dayMapping = {
-              'monday': 1, 'tuesday': 2, 'wednesday': 3, 'thursday': 4, 'friday': 5,
-              'poniedziałek': 1, 'wtorek': 2, 'środa': 3, 'czwartek': 4, 'piątek': 5
-            };
-            
-            if (dayMapping[day.toLowerCase()]) {
-              // Find next occurrence of this weekday
-              const today = new Date();
-              const todayWeekday = today.getDay(); // 0 = Sunday, 1 = Monday
-              const targetWeekdayNum = dayMapping[day.toLowerCase()];
-              daysToAdd = (targetWeekdayNum - todayWeekday + 7) % 7;
-              if (daysToAdd === 0 && day.toLowerCase() !== 'today') {
-                daysToAdd = 7; // Next week if it's the same day
-              }
-            } else {
-              switch (day.toLowerCase()) {
-                case 'tomorrow':
-                  daysToAdd = 1;
-                  break;
-                case 'today':
-                  daysToAdd = 0;
-                  break;
-                default:
-                  reject(new Error('Invalid day parameter'));
-                  return;
-              }
-            }
-            
-            targetDate.setDate(targetDate.getDate() + daysToAdd);
-            targetDateStr = targetDate.toISOString().split('T')[0];
-          }
-          
-          // Get weekday name in Polish
-          const weekdayIndex = targetDate.getDay();
-          const weekdays = ['niedziela', 'poniedziałek', 'wtorek', 'środa', 'czwartek', 'piątek', 'sobota'];
-          targetWeekday = weekdays[weekdayIndex];
-          
-          // Filter events for the target date
-          const dayEvents = allEvents.filter(event => event.date === targetDateStr);
+          const dayEvents = data.events || [];
           
           // Get lessons for the weekday
           const lessons = schedule[targetWeekday] || [];
@@ -383,7 +241,7 @@ export default {
         } catch (error) {
           reject(new Error(`Failed to parse combined data: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -396,74 +254,37 @@ export default {
    */
   async getUpcoming({ days = 30, eventType = null } = {}) {
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--calendar'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
+      // Upcoming events within the specified days, filtered by mobi.py
+      const now = new Date();
+      const futureLimit = new Date();
+      futureLimit.setDate(now.getDate() + days);
+      
+      const filters = {
+        from: now.toISOString().split('T')[0],
+        to: futureLimit.toISOString().split('T')[0]
+      };
+      
+      // Filter by event type if specified
+      if (eventType) {
+        filters.type = [eventType];
+      }
       
+      query('calendar', filters).then((data) => {
         try {
-          const data = JSON.parse(outputData);
-          const allEvents = data.events || [];
-          
-          // Filter for upcoming events within the specified days
-          const now = new Date();
-          const futureLimit = new Date();
-          futureLimit.setDate(now.getDate() + days);
-          
-          let upcomingEvents = allEvents.filter(event => {
-            const eventDate = new Date(event.date);
-            return eventDate >= now && eventDate <= futureLimit;
-          });
-
-          // Filter by event type if specified
-          if (eventType) {
-            upcomingEvents = upcomingEvents.filter(event => 
-              event.event_type === eventType
-            );
-          }
-          
-          // Sort by date
-          upcomingEvents.sort((a, b) => new Date(a.date) - new Date(b.date));
+          // Already sorted by date
+          const upcomingEvents = data.events || [];
           
           resolve({
             events: upcomingEvents,
             daysAhead: days,
             eventType: eventType,
-            totalEvents: allEvents.length
+            totalEvents: data.total_events ?? upcomingEvents.length
           });
       
         } catch (error) {
           reject(new Error(`Failed to parse events: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -473,41 +294,8 @@ export default {
    */
   async getByType() {
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--calendar'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
-      
+      query('calendar').then((data) => {
         try {
-          const data = JSON.parse(outputData);
           const allEvents = data.events || [];
           
           // Group events by type
@@ -535,7 +323,7 @@ export default {
         } catch (error) {
           reject(new Error(`Failed to parse events: ${error.message}`));
         }
-      });
+      }, reject);
     });
   },
 
@@ -552,71 +340,31 @@ export default {
     }
 
     return new Promise((resolve, reject) => {
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--calendar'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
+      const start = new Date(startDate);
+      const end = new Date(endDate);
       
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
+      if (isNaN(start.getTime()) || isNaN(end.getTime())) {
+        reject(new Error('Invalid date format. Use YYYY-MM-DD'));
+        return;
+      }
       
+      // mobi.py filters events within the date range
+      query('calendar', { from: startDate, to: endDate }).then((data) => {
         try {
-          const data = JSON.parse(outputData);
-          const allEvents = data.events || [];
-          
-          const start = new Date(startDate);
-          const end = new Date(endDate);
-          
-          if (isNaN(start.getTime()) || isNaN(end.getTime())) {
-            reject(new Error('Invalid date format. Use YYYY-MM-DD'));
-            return;
-          }
-          
-          // Filter events within the date range
-          const rangeEvents = allEvents.filter(event => {
-            const eventDate = new Date(event.date);
-            return eventDate >= start && eventDate <= end;
-          });
-          
-          // Sort by date
-          rangeEvents.sort((a, b) => new Date(a.date) - new Date(b.date));
+          // Already sorted by date
+          const rangeEvents = data.events || [];
           
           resolve({
             events: rangeEvents,
             startDate,
             endDate,
-            totalEvents: allEvents.length
+            totalEvents: data.total_events ?? rangeEvents.length
           });
       
         } catch (error) {
           reject(new Error(`Failed to parse events: ${error.message}`));
         }
-      });
+      }, reject);
     });
   }
 };
\ No newline at end of file
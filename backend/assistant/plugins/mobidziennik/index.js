@@ -1,13 +1,8 @@
-import { spawn } from 'child_process';
 import dotenv from 'dotenv';
-import path from 'path';
-import { fileURLToPath } from 'url';
+import { query } from './daemon.js';
 
 dotenv.config();
 
-const __filename = fileURLToPath(import.meta.url);
-const __dirname = path.dirname(__filename);
-
 const USERNAME = process.env.MOBI_USERNAME;
 const PASSWORD = process.env.MOBI_PASSWORD;
 
@@ -56,39 +51,7 @@ export default {
         return;
       }
 
-      const pythonScript = path.join(__dirname, 'mobi.py');
-      
-      const python = spawn(process.platform === 'win32' ? 'python' : 'python3', [
-        pythonScript,
-        '-u', USERNAME,
-        '-p', PASSWORD,
-        '--schedule'
-      ], {
-        encoding: 'utf-8'
-      });
-      
-      let outputData = '';
-      let errorData = '';
-      
-      python.stdout.on('data', (data) => {
-        outputData += data.toString('utf-8');
-      });
-      
-      python.stderr.on('data', (data) => {
-        errorData += data.toString('utf-8');
-      });
-      
-      python.on('close', (code) => {
-        if (code !== 0) {
-          try {
-            const error = JSON.parse(errorData);
-            reject(new Error(error.error));
-          } catch {
-            reject(new Error(`Python script failed: ${errorData}`));
-          }
-          return;
-        }
-      
+      query('schedule').then((fullSchedule) => {
         try {
           function decodePolishChars(text) {
             const replacements = {
@@ -139,7 +102,6 @@ export default {
             return obj;
           }
 
-          let fullSchedule = JSON.parse(outputData);
           const decodedResponse = deepDecode(fullSchedule);
           
           // Extract the actual schedule from the nested structure
@@ -198,11 +160,10 @@ export default {
 
         } catch (error) {
           console.error('Parse error:', error);
-          console.error('Raw output:', outputData);
+          console.error('Raw output:', fullSchedule);
           reject(new Error(`Failed to parse schedule output: ${error.message}`));
         }
-      });
-      
+      }, reject);
     });
   }
 };
\ No newline at end of file
@@ -1,13 +1,23 @@
 import argparse
+import os
 import sys
 import json
 import locale
 import codecs
+import hashlib
+import random
 import re
+import sqlite3
+import threading
+import time
 
-from typing import Dict, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import requests
-from bs4 import BeautifulSoup
 from dataclasses import dataclass, asdict
 
 # Set UTF-8 encoding explicitly
@@ -36,6 +46,471 @@ class CalendarEvent:
     color: Optional[str] = None
     event_type: Optional[str] = None
 
+# Polish weekday names indexed by date.weekday()
+WEEKDAY_NAMES = ["poniedziałek", "wtorek", "środa", "czwartek", "piątek", "sobota", "niedziela"]
+
+# Day names accepted by --day besides YYYY-MM-DD
+RELATIVE_DAYS = {"today": 0, "tomorrow": 1, "dayaftertomorrow": 2}
+WEEKDAY_ALIASES = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4,
+    "saturday": 5, "sunday": 6,
+    **{name: index for index, name in enumerate(WEEKDAY_NAMES)}
+}
+
+@dataclass
+class Query:
+    """Filters applied to the fetched data before serialization"""
+    date_from: Optional[str] = None  # YYYY-MM-DD, inclusive
+    date_to: Optional[str] = None  # YYYY-MM-DD, inclusive
+    event_types: Optional[List[str]] = None
+    weekday: Optional[str] = None
+    limit: Optional[int] = None
+
+    def matches(self, event: CalendarEvent) -> bool:
+        event_date = event.date[:10]
+        if self.date_from and event_date < self.date_from:
+            return False
+        if self.date_to and event_date > self.date_to:
+            return False
+        if self.event_types and event.event_type not in self.event_types:
+            return False
+        return True
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise Exception(f"Invalid date: {value}. Use YYYY-MM-DD")
+
+def resolve_day(day: str, today: Optional[date] = None) -> date:
+    """Resolve 'today', 'tomorrow', 'dayaftertomorrow', a weekday name or YYYY-MM-DD to a date"""
+    today = today or date.today()
+    name = day.strip().lower()
+    
+    if name in RELATIVE_DAYS:
+        return today + timedelta(days=RELATIVE_DAYS[name])
+    
+    if name in WEEKDAY_ALIASES:
+        # Next occurrence of that weekday, a week ahead if it is today
+        days_ahead = (WEEKDAY_ALIASES[name] - today.weekday()) % 7
+        return today + timedelta(days=days_ahead or 7)
+    
+    return _parse_date(day)
+
+def make_query(day: Optional[str] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None, event_types: Union[str, List[str], None] = None,
+               limit: Optional[int] = None) -> Optional[Query]:
+    """Build a Query from CLI/daemon arguments, or None when nothing is filtered"""
+    if isinstance(event_types, str):
+        event_types = [t.strip() for t in event_types.split(',') if t.strip()]
+    
+    query = Query(
+        date_from=_parse_date(date_from).isoformat() if date_from else None,
+        date_to=_parse_date(date_to).isoformat() if date_to else None,
+        event_types=event_types or None,
+        limit=int(limit) if limit is not None else None
+    )
+    
+    if day:
+        target = resolve_day(day)
+        query.date_from = query.date_to = target.isoformat()
+        query.weekday = WEEKDAY_NAMES[target.weekday()]
+    
+    if query == Query():
+        return None
+    return query
+
+def filter_schedule(schedule: Dict[str, List[Lesson]], query: Optional[Query]) -> Dict[str, List[Lesson]]:
+    if not query or not query.weekday:
+        return schedule
+    return {day: lessons for day, lessons in schedule.items() if day == query.weekday}
+
+def filter_events(events: List[CalendarEvent], query: Optional[Query]) -> List[CalendarEvent]:
+    # event_type is determined once while parsing, so filtering is a field compare
+    if not query:
+        return events
+    
+    selected = [event for event in events if query.matches(event)]
+    if query.limit is not None:
+        selected = selected[:query.limit]
+    return selected
+
+def event_key(event: CalendarEvent) -> str:
+    """Stable identity of an event: its id, or a hash of date and title without one"""
+    if event.event_id not in (None, ''):
+        return str(event.event_id)
+    return hashlib.sha256(f"{event.date}\n{event.title}".encode('utf-8')).hexdigest()[:16]
+
+# Serializes read-modify-write of the session file between clients in one process
+_SESSION_FILE_LOCK = threading.Lock()
+
+def _write_private_json(path: str, data: Any) -> None:
+    """Atomically write JSON to a file readable by the owner only"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+class ResponseCache:
+    """On-disk cache of parsed pages, keyed by account and URL"""
+    
+    def __init__(self, directory: str, account: str):
+        self.directory = directory
+        self.account = account
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(f"{self.account}\n{url}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{key[:32]}.json")
+
+    def load(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._path(url), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if not isinstance(entry, dict) or entry.get('url') != url:
+            return None
+        return entry
+
+    def store(self, url: str, entry: dict) -> None:
+        try:
+            _write_private_json(self._path(url), entry)
+        except OSError as e:
+            print(f"Warning: Failed to write cache: {e}", file=sys.stderr)
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process started, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+class DeadlineExceeded(Exception):
+    """Raised when a call runs out of its deadline budget"""
+
+class Profiler:
+    """Wall-clock time per phase plus counters, reported as one JSON object.
+
+    Phases may run concurrently (fetch() gets both sections in parallel), so
+    their times are summed per phase rather than nested. Recording costs a
+    couple of perf_counter() calls, cheap enough to leave on.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            phase = self.phases.setdefault(name, [0.0, 0])
+            phase[0] += seconds
+            phase[1] += 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def count(self, name: str, value: int) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+                'phases': {
+                    name: {'ms': round(seconds * 1000, 3), 'calls': calls}
+                    for name, (seconds, calls) in self.phases.items()
+                },
+                'counts': dict(self.counts),
+            }
+
+    def emit(self, **extra) -> None:
+        """Print the report as a single {"profile": {...}} line on stderr"""
+        print(json.dumps({'profile': {**extra, **self.report()}}), file=sys.stderr, flush=True)
+
+class _ScanComplete(Exception):
+    """Raised by _ScheduleScanner to stop feeding once the container closes"""
+
+class _ScheduleScanner(HTMLParser):
+    """Single-pass scanner for the plansc_cnt schedule container.
+
+    Collects the attributes of the first direct child div of every
+    plansc_cnt_w cell in document order, without building a tree, and stops
+    as soon as the container is closed. Tag nesting follows BeautifulSoup's
+    html.parser tree builder (void tags are never opened, an end tag closes
+    the nearest open tag of that name) so the result matches a full-document
+    parse.
+    """
+    
+    VOID_TAGS = {
+        'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed',
+        'frame', 'hr', 'image', 'img', 'input', 'isindex', 'keygen', 'link',
+        'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer', 'track', 'wbr'
+    }
+    
+    def __init__(self):
+        super().__init__()
+        # Open tags as (name, cell slot or None)
+        self.stack: List[tuple] = []
+        # Stack index of the plansc_cnt container once it has been opened
+        self.container_depth: Optional[int] = None
+        # One single-item slot per plansc_cnt_w cell, holding its first child div's attributes
+        self.cells: List[list] = []
+
+    @staticmethod
+    def _has_class(attrs: Dict[str, str], name: str) -> bool:
+        value = attrs.get('class', '')
+        return value == name or name in value.split()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_TAGS:
+            return
+        
+        slot = None
+        if tag == 'div':
+            attrs = {key: value if value is not None else '' for key, value in attrs}
+            
+            if self.container_depth is None:
+                if self._has_class(attrs, 'plansc_cnt'):
+                    self.container_depth = len(self.stack)
+            else:
+                parent_slot = self.stack[-1][1]
+                if parent_slot is not None and parent_slot[0] is None:
+                    parent_slot[0] = attrs
+                
+                if self._has_class(attrs, 'plansc_cnt_w'):
+                    slot = [None]
+                    self.cells.append(slot)
+        
+        self.stack.append((tag, slot))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+        
+        if self.container_depth is not None and len(self.stack) <= self.container_depth:
+            raise _ScanComplete()
+
+    @classmethod
+    def scan(cls, html_content: str) -> Optional[List[Optional[Dict[str, str]]]]:
+        """Return the first child div attributes of each cell, or None without a container"""
+        scanner = cls()
+        
+        try:
+            scanner.feed(html_content)
+            scanner.close()
+        except _ScanComplete:
+            pass
+        
+        if scanner.container_depth is None:
+            return None
+        return [slot[0] for slot in scanner.cells]
+
+# A quoted JavaScript string, with escapes
+_JS_STRING = r"""(?:"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*')"""
+_JS_WORD = r"""[^\s\[\]{},:"'/]+"""
+
+# Tokens of a JavaScript literal: whitespace and comments are skipped, strings
+# keep their quotes, and anything else is punctuation or a bare word
+_JS_TOKEN = re.compile(
+    r'\s*(?:(?P<skip>(?://[^\n]*|/\*.*?\*/)\s*)+'
+    r'|(?P<string>' + _JS_STRING + r')'
+    r'|(?P<punct>[\[\]{},:])'
+    r'|(?P<word>' + _JS_WORD + r'))',
+    re.DOTALL
+)
+
+# A whole "key: scalar," pair, so flat objects take one match per property
+_JS_PAIR = re.compile(
+    r'\s*(?:(?P<key>' + _JS_WORD + r')|(?P<qkey>' + _JS_STRING + r'))\s*:'
+    r'\s*(?:(?P<string>' + _JS_STRING + r')|(?P<word>' + _JS_WORD + r'))'
+    r'\s*(?P<end>[,}])'
+)
+
+_JS_ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\n|.)', re.DOTALL)
+_JS_SIMPLE_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0', '\n': ''}
+_JS_WORDS = {'true': True, 'false': False, 'null': None, 'undefined': None}
+
+def _decode_js_string(literal: str) -> str:
+    """Decode a quoted JavaScript string literal the way JSON.parse would"""
+    if '\\' not in literal:
+        return literal[1:-1]
+    
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in 'ux' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return _JS_SIMPLE_ESCAPES.get(escape, escape)
+    
+    text = _JS_ESCAPE.sub(replace, literal[1:-1])
+    if any('\ud800' <= char <= '\udfff' for char in text):
+        # Join \uXXXX surrogate pairs into single characters
+        text = text.encode('utf-16', 'surrogatepass').decode('utf-16', 'replace')
+    return text
+
+class _JSLiteralReader:
+    """Streaming reader for JavaScript array/object literals.
+
+    Handles unquoted keys, single- and double-quoted strings, comments and
+    trailing commas, which is what FullCalendar initialization code uses.
+    Raises ValueError on anything else.
+    """
+    
+    def __init__(self, text: str, pos: int = 0):
+        self.text = text
+        self.pos = pos
+        self._peeked: Optional[Tuple[str, str]] = None
+
+    def _next(self) -> Tuple[str, str]:
+        if self._peeked:
+            token, self._peeked = self._peeked, None
+            return token
+        
+        while True:
+            match = _JS_TOKEN.match(self.text, self.pos)
+            if not match:
+                if not self.text[self.pos:].strip():
+                    raise ValueError("Unexpected end of input")
+                raise ValueError(f"Unexpected character {self.text[self.pos]!r} at {self.pos}")
+            
+            self.pos = match.end()
+            if match.lastgroup != 'skip':
+                return match.lastgroup, match.group(match.lastgroup)
+
+    def _peek(self) -> Tuple[str, str]:
+        if not self._peeked:
+            self._peeked = self._next()
+        return self._peeked
+
+    def _expect(self, value: str) -> None:
+        kind, token = self._next()
+        if token != value or kind != 'punct':
+            raise ValueError(f"Expected {value!r} but found {token!r} at {self.pos}")
+
+    def _word(self, token: str) -> Any:
+        if token in _JS_WORDS:
+            return _JS_WORDS[token]
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise ValueError(f"Unsupported value {token!r} at {self.pos}")
+
+    def parse_value(self) -> Any:
+        kind, token = self._next()
+        
+        if kind == 'string':
+            return _decode_js_string(token)
+        if kind == 'word':
+            return self._word(token)
+        if token == '{':
+            return self._parse_object()
+        if token == '[':
+            return list(self._iter_items())
+        raise ValueError(f"Unexpected {token!r} at {self.pos}")
+
+    def _parse_object(self) -> dict:
+        result = {}
+        
+        while True:
+            match = _JS_PAIR.match(self.text, self.pos)
+            if match:
+                self.pos = match.end()
+                key = match.group('key') or _decode_js_string(match.group('qkey'))
+                if match.group('string') is not None:
+                    result[key] = _decode_js_string(match.group('string'))
+                else:
+                    result[key] = self._word(match.group('word'))
+                
+                if match.group('end') == '}':
+                    return result
+                continue
+            
+            kind, token = self._next()
+            if token == '}' and kind == 'punct':
+                return result
+            
+            if kind == 'string':
+                key = _decode_js_string(token)
+            elif kind == 'word':
+                key = token
+            else:
+                raise ValueError(f"Expected a key but found {token!r} at {self.pos}")
+            
+            self._expect(':')
+            result[key] = self.parse_value()
+            
+            kind, token = self._next()
+            if token == '}' and kind == 'punct':
+                return result
+            if token != ',' or kind != 'punct':
+                raise ValueError(f"Expected ',' or '}}' but found {token!r} at {self.pos}")
+
+    def _skip_value(self) -> None:
+        """Move past one value without building it, only balancing brackets"""
+        depth = 0
+        while True:
+            kind, token = self._next()
+            if kind == 'punct' and token in '{[':
+                depth += 1
+            elif kind == 'punct' and token in '}]':
+                depth -= 1
+                if depth < 0:
+                    raise ValueError(f"Unexpected {token!r} at {self.pos}")
+            if depth == 0:
+                return
+
+    def _iter_items(self, on_error: Optional[Callable[[ValueError], None]] = None) -> Iterator[Any]:
+        while True:
+            start = self.pos
+            if self._peek() == ('punct', ']'):
+                self._next()
+                return
+            
+            if on_error is None:
+                yield self.parse_value()
+            else:
+                try:
+                    value = self.parse_value()
+                except ValueError as e:
+                    # Report the item and step over it, brackets balanced
+                    on_error(e)
+                    self._peeked = None
+                    self.pos = start
+                    self._skip_value()
+                else:
+                    yield value
+            
+            kind, token = self._next()
+            if token == ']' and kind == 'punct':
+                return
+            if token != ',' or kind != 'punct':
+                raise ValueError(f"Expected ',' or ']' but found {token!r} at {self.pos}")
+
+    def iter_array(self, on_error: Optional[Callable[[ValueError], None]] = None) -> Iterator[Any]:
+        """Yield the items of the array starting at the current position one by one.
+
+        With on_error, an item that cannot be read is passed over (on_error
+        gets the error) instead of ending the array.
+        """
+        self._expect('[')
+        yield from self._iter_items(on_error)
+
 class MobiClient:
     """Client for interacting with the MobiDziennik school system"""
     
@@ -49,7 +524,54 @@ class MobiClient:
         "18:25": 13, "19:15": 14, "20:05": 15
     }
     
-    def __init__(self, username: str, password: str):
+    SCHEDULE_PATH = "/planlekcji?typ=podstawowy"
+    CALENDAR_PATH = "/kalendarzklasowy"
+    
+    # Seconds a cached page is served without asking the server
+    CACHE_TTL = {
+        SCHEDULE_PATH: 6 * 60 * 60,
+        CALENDAR_PATH: 60 * 60,
+    }
+    # Seconds past the TTL during which a long-lived process (serve()) still
+    # serves the cached page while it is revalidated in the background. A
+    # one-shot CLI call would exit before that revalidation finished, so it
+    # revalidates synchronously as soon as the TTL is up.
+    CACHE_STALE_WINDOW = 60 * 60
+    # Deadline of a background revalidation, login and retries included
+    REVALIDATE_DEADLINE = 15
+    
+    LOGIN_FAILED_MARKER = "Podano niepoprawny login i/lub hasło"
+    LOGIN_FORM_MARKER = 'name="haslo"'
+    
+    # (connect, read) timeout of a single request, also within a deadline
+    REQUEST_TIMEOUT = (5, 20)
+    # Retries after a connection error, timeout or 5xx, with full jitter
+    # backoff of up to RETRY_BACKOFF * 2**attempt seconds
+    RETRIES = 2
+    RETRY_BACKOFF = 0.2
+    
+    # Names the pages go by in profiles
+    SECTIONS = {
+        SCHEDULE_PATH: 'schedule',
+        CALENDAR_PATH: 'calendar',
+    }
+
+    def __init__(self, username: str, password: str, session_file: Optional[str] = None,
+                 cache_dir: Optional[str] = None, base_url: Optional[str] = None,
+                 deadline: Optional[float] = None):
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+        self.username = username
+        self.password = password
+        # Identifies the user across schools in the session file, cache and stores
+        self.account = f"{self.base_url}|{username}"
+        self.session_file = session_file
+        self._saved_cookies: Optional[list] = None
+        self.cache = ResponseCache(cache_dir, self.account) if cache_dir else None
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        # Set by serve(): only a long-lived process outlives the background
+        # refreshes started on its behalf
+        self.background_refresh = False
         self.session = requests.Session()
         # Set proper headers for UTF-8
         self.session.headers.update({
@@ -59,14 +581,218 @@ class MobiClient:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
         
-        response = self.session.post(
-            self.BASE_URL,
-            data={"login": username, "haslo": password}
-        )
+        # Logging in is deferred to the first request that needs the server,
+        # so answers served from the cache cost no round-trip at all. A
+        # restored session is only verified by the first page GET, which
+        # logs in again if the server answers with the login form.
+        self._logged_in = self._load_session()
+        self._login_lock = threading.Lock()
+        # Bumped by every login, so threads that all found the session
+        # expired log in only once between them
+        self._login_generation = 0
+        
+        # Set to a Profiler to record where the time goes
+        self.profile: Optional[Profiler] = None
+        
+        # Seconds each fetch() may take in total, across login, retries and
+        # pages; the running deadline is per thread (see budget())
+        self.deadline = deadline
+        self._local = threading.local()
+        # Last parsed result of every page, served stale when the server fails
+        self._last_good: Dict[str, Tuple[float, Any]] = {}
+
+    def _phase(self, name: str):
+        return self.profile.phase(name) if self.profile else nullcontext()
+
+    def _count(self, name: str, value: int) -> None:
+        if self.profile:
+            self.profile.count(name, value)
+
+    @contextmanager
+    def budget(self, deadline_at: Optional[float] = None) -> Iterator[Optional[float]]:
+        """Bound the requests made inside to a deadline (a time.monotonic() value).
+
+        Without deadline_at a running budget is kept, or a new one of
+        self.deadline seconds is started. Yields the deadline so worker
+        threads can be given the same one.
+        """
+        previous = getattr(self._local, 'deadline_at', None)
+        if deadline_at is None:
+            deadline_at = previous
+        if deadline_at is None and self.deadline:
+            deadline_at = time.monotonic() + self.deadline
+        
+        self._local.deadline_at = deadline_at
+        try:
+            yield deadline_at
+        finally:
+            self._local.deadline_at = previous
+
+    def call_within(self, deadline_at: Optional[float], fn: Callable[..., Any], *args) -> Any:
+        """Call fn in a budget with the given deadline, e.g. from a worker thread"""
+        with self.budget(deadline_at):
+            return fn(*args)
+
+    def _remaining(self) -> Optional[float]:
+        """Seconds left in the running budget (may be negative), or None without one"""
+        deadline_at = getattr(self._local, 'deadline_at', None)
+        return None if deadline_at is None else deadline_at - time.monotonic()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request within the budget, retrying connection errors and 5xx"""
+        for attempt in range(self.RETRIES + 1):
+            timeout = self.REQUEST_TIMEOUT
+            remaining = self._remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise DeadlineExceeded("Deadline exceeded")
+                timeout = tuple(min(limit, remaining) for limit in timeout)
+            
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code < 500 or attempt == self.RETRIES:
+                    return response
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.RETRIES:
+                    raise
+                error = str(e)
+            
+            delay = random.uniform(0, self.RETRY_BACKOFF * 2 ** attempt)
+            remaining = self._remaining()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded(f"Deadline exceeded after {error}")
+            
+            self._count('retries', 1)
+            time.sleep(delay)
+
+    def login(self) -> None:
+        """Log in with the stored credentials, (re)establishing the session"""
+        with self._phase('login'):
+            response = self._request(
+                'POST',
+                self.base_url,
+                data={"login": self.username, "haslo": self.password}
+            )
         response.raise_for_status()
         
-        if "Podano niepoprawny login i/lub hasło" in response.text:
+        if self.LOGIN_FAILED_MARKER in response.text:
             raise Exception("Invalid credentials")
+        
+        self._logged_in = True
+        self._login_generation += 1
+        self._save_session()
+
+    def _cookie_list(self) -> list:
+        return [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires,
+            }
+            for cookie in self.session.cookies
+        ]
+
+    def _read_session_file(self) -> dict:
+        try:
+            with open(self.session_file, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _load_session(self) -> bool:
+        """Restore the cookies saved for this user by a previous run"""
+        if not self.session_file:
+            return False
+        
+        cookies = self._read_session_file().get(self.account)
+        if not cookies:
+            return False
+        
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False),
+                expires=cookie.get("expires"),
+            )
+        
+        self._saved_cookies = self._cookie_list()
+        return True
+
+    def _save_session(self) -> None:
+        """Persist the session cookies for this user (readable by the owner only)"""
+        if not self.session_file:
+            return
+        
+        cookies = self._cookie_list()
+        if cookies == self._saved_cookies:
+            return
+        
+        with _SESSION_FILE_LOCK:
+            data = self._read_session_file()
+            data[self.account] = cookies
+            
+            try:
+                _write_private_json(self.session_file, data)
+            except OSError as e:
+                print(f"Warning: Failed to save session: {e}", file=sys.stderr)
+                return
+        
+        self._saved_cookies = cookies
+
+    def _is_login_page(self, response: requests.Response) -> bool:
+        """Check whether the server answered with the login form (expired session)"""
+        return self.LOGIN_FORM_MARKER in response.text
+
+    @contextmanager
+    def _login_locked(self) -> Iterator[None]:
+        # Another thread may be stuck logging in; don't wait past the deadline
+        remaining = self._remaining()
+        if not self._login_lock.acquire(timeout=-1 if remaining is None else max(remaining, 0)):
+            raise DeadlineExceeded("Deadline exceeded waiting for login")
+        try:
+            yield
+        finally:
+            self._login_lock.release()
+
+    def _get(self, path: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """GET a page, logging in again once if the session has expired"""
+        with self._login_locked():
+            if not self._logged_in:
+                self.login()
+            generation = self._login_generation
+        
+        section = self.SECTIONS.get(path, path)
+        with self._phase(f'get_{section}'):
+            response = self._request('GET', f"{self.base_url}{path}", headers=headers)
+        response.raise_for_status()
+        
+        if self._is_login_page(response):
+            with self._login_locked():
+                # Skip the login if another thread has logged in since this GET
+                if self._login_generation == generation:
+                    self.login()
+            
+            with self._phase(f'get_{section}'):
+                response = self._request('GET', f"{self.base_url}{path}", headers=headers)
+            response.raise_for_status()
+            
+            if self._is_login_page(response):
+                # Never hand the login form on as the page (it parses as empty)
+                raise Exception(f"Still asked to log in for {section} after logging in")
+        
+        self._count(f'{section}_bytes', len(response.content))
+        
+        # The server may rotate the session cookie on any request
+        self._save_session()
+        return response
 
     def _decode_unicode_escapes(self, text: str) -> str:
         """Decode Unicode escape sequences like \\u0144 to proper UTF-8"""
@@ -191,73 +917,44 @@ class MobiClient:
 
     def _extract_calendar_events(self, html_content: str) -> List[CalendarEvent]:
         """Extract events from FullCalendar JavaScript initialization"""
-        events = []
-        
-        # Look for the events array in the FullCalendar initialization
+        return list(self._iter_calendar_events(html_content))
+
+    def _iter_calendar_events(self, html_content: str) -> Iterator[CalendarEvent]:
+        """Yield events from the FullCalendar events: [...] literal in one pass"""
         # Pattern: events: [{...}, {...}, ...]
-        pattern = r'events:\s*\[(.*?)\](?=\s*[,}])'
-        match = re.search(pattern, html_content, re.DOTALL)
-        
+        match = re.search(r'events:\s*\[', html_content)
         if not match:
-            return events
+            return
+        
+        reader = _JSLiteralReader(html_content, match.end() - 1)
         
-        events_text = '[' + match.group(1) + ']'
+        def skipped(error):
+            print(f"Warning: Skipping malformed calendar event: {error}", file=sys.stderr)
         
         try:
-            # Parse the JavaScript array as JSON
-            # Handle JavaScript object format
-            events_text = re.sub(r'(\w+):', r'"\1":', events_text)  # Quote unquoted property names
-            events_text = re.sub(r"'([^']*)'", r'"\1"', events_text)  # Convert single quotes to double
-            
-            # Parse as JSON
-            events_data = json.loads(events_text)
-            
-            for event_data in events_data:
+            for event_data in reader.iter_array(on_error=skipped):
                 if isinstance(event_data, dict):
-                    # Decode Unicode escapes in title and comment
-                    title = self._decode_unicode_escapes(event_data.get('title', ''))
-                    comment = self._decode_unicode_escapes(event_data.get('comment', ''))
-                    
-                    event = CalendarEvent(
-                        date=event_data.get('start', ''),
-                        title=title,
-                        description=comment if comment and comment != title else None,
-                        event_id=event_data.get('id', ''),
-                        color=event_data.get('color', ''),
-                        event_type=self._determine_event_type_from_title(title)
-                    )
-                    events.append(event)
-                    
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Warning: Failed to parse calendar events with JSON: {e}", file=sys.stderr)
-            # Fallback: try to extract events manually with regex
-            events = self._extract_events_manual(html_content)
-        
-        return events
+                    yield self._calendar_event_from_dict(event_data)
+        except ValueError as e:
+            # Events read before the unreadable part are kept
+            print(f"Warning: Failed to parse calendar events: {e}", file=sys.stderr)
 
-    def _extract_events_manual(self, html_content: str) -> List[CalendarEvent]:
-        """Manually extract events using regex when JSON parsing fails"""
-        events = []
-        
-        # Look for individual event objects in the JavaScript
-        # This regex handles the actual format with escaped quotes
-        event_pattern = r'\{\s*"title":\s*"([^"]*)",\s*"start":\s*"([^"]*)"[^}]*?"comment":\s*"([^"]*)"[^}]*?\}'
-        matches = re.findall(event_pattern, html_content, re.DOTALL)
-        
-        for title, start_date, comment in matches:
-            # Decode Unicode escapes
-            title = self._decode_unicode_escapes(title)
-            comment = self._decode_unicode_escapes(comment)
-            
-            event = CalendarEvent(
-                date=start_date,
-                title=title,
-                description=comment if comment != title else None,
-                event_type=self._determine_event_type_from_title(title)
-            )
-            events.append(event)
+    def _calendar_event_from_dict(self, event_data: dict) -> CalendarEvent:
+        # The reader has decoded the string literals already; only text the
+        # page escaped twice still holds \uXXXX sequences
+        title, comment = (
+            self._decode_unicode_escapes(text) if isinstance(text, str) and '\\u' in text else text
+            for text in (event_data.get('title', ''), event_data.get('comment', ''))
+        )
         
-        return events
+        return CalendarEvent(
+            date=event_data.get('start', ''),
+            title=title,
+            description=comment if comment and comment != title else None,
+            event_id=event_data.get('id', ''),
+            color=event_data.get('color', ''),
+            event_type=self._determine_event_type_from_title(title)
+        )
 
     def _determine_event_type_from_title(self, title: str) -> str:
         """Determine event type based on title content"""
@@ -282,22 +979,154 @@ class MobiClient:
         else:
             return 'other'
 
-    def get_schedule(self) -> Dict[str, List[Lesson]]:
-        """Get the weekly schedule from planlekcji"""
-        response = self.session.get(f"{self.BASE_URL}/planlekcji?typ=podstawowy")
-        response.raise_for_status()
+    def _revalidate(self, path: str, parse: Callable[[str], Any],
+                    dump: Callable[[Any], Any], entry: Optional[dict]) -> dict:
+        """Fetch a page conditionally and refresh its cache entry.
+
+        The page is only parsed again if the server reports a change and the
+        body hash differs from the cached one.
+        """
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        
+        response = self._get(path, headers=headers)
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        schedule_cnt = soup.find('div', class_='plansc_cnt')
+        if entry and response.status_code == 304:
+            entry = dict(entry, fetched_at=time.time())
+        else:
+            body_hash = hashlib.sha256(response.content).hexdigest()
+            if entry and entry.get('body_hash') == body_hash:
+                parsed = entry['parsed']
+            else:
+                parsed = dump(parse(response.text))
+            
+            entry = {
+                'url': path,
+                'fetched_at': time.time(),
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'body_hash': body_hash,
+                'parsed': parsed,
+            }
+        
+        self.cache.store(path, entry)
+        return entry
+
+    def _revalidate_in_background(self, path: str, parse: Callable[[str], Any],
+                                  dump: Callable[[Any], Any], entry: dict) -> None:
+        with self._revalidating_lock:
+            if path in self._revalidating:
+                return
+            self._revalidating.add(path)
+        
+        def run():
+            try:
+                self.call_within(time.monotonic() + self.REVALIDATE_DEADLINE,
+                                 self._revalidate, path, parse, dump, entry)
+            except Exception as e:
+                print(f"Warning: Failed to revalidate {path}: {e}", file=sys.stderr)
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(path)
+        
+        # A daemon thread, so it never keeps serve() alive after stdin closes
+        threading.Thread(target=run, daemon=True).start()
+
+    def _cached(self, path: str, parse: Callable[[str], Any], dump: Callable[[Any], Any],
+                load: Callable[[Any], Any], revalidate: bool = False) -> Any:
+        """Get a parsed page, serving it from the cache while it is fresh enough.
+
+        With revalidate=True the cached page is always checked with the
+        server first (a conditional GET), however fresh it is. Past its TTL
+        it is checked the same way, unless background_refresh is set, in
+        which case it is served for CACHE_STALE_WINDOW more seconds while it
+        is revalidated in the background.
+        """
+        if not self.cache:
+            parsed = parse(self._get(path).text)
+            self._last_good[path] = (time.time(), parsed)
+            return parsed
+        
+        with self._phase('cache_load'):
+            entry = self.cache.load(path)
+        if entry and not revalidate:
+            age = time.time() - entry.get('fetched_at', 0)
+            ttl = self.CACHE_TTL.get(path, 0)
+            
+            window = self.CACHE_STALE_WINDOW if self.background_refresh else 0
+            
+            if age < ttl + window:
+                if age >= ttl:
+                    self._revalidate_in_background(path, parse, dump, entry)
+                self._count('cache_hits', 1)
+                parsed = load(entry['parsed'])
+                self._last_good[path] = (entry.get('fetched_at', 0), parsed)
+                return parsed
+        
+        entry = self._revalidate(path, parse, dump, entry)
+        parsed = load(entry['parsed'])
+        self._last_good[path] = (entry['fetched_at'], parsed)
+        return parsed
+
+    def last_good(self, path: str, load: Callable[[Any], Any]) -> Optional[Tuple[Any, float]]:
+        """The last page fetched successfully, from memory or the cache, and its age in seconds"""
+        if path in self._last_good:
+            fetched_at, parsed = self._last_good[path]
+        else:
+            entry = self.cache.load(path) if self.cache else None
+            if not entry:
+                return None
+            fetched_at, parsed = entry.get('fetched_at', 0), load(entry['parsed'])
         
-        if not schedule_cnt:
+        return parsed, time.time() - fetched_at
+
+    def fetch_if_changed(self, section: str, known_hash: Optional[str]) -> Tuple[str, Any]:
+        """Fetch the 'schedule' or 'events' page, parsing it only if it changed.
+
+        Returns the body hash and the parsed result, or None in place of the
+        result when the hash equals known_hash.
+        """
+        path, parse = {
+            'schedule': (self.SCHEDULE_PATH, self._parse_schedule),
+            'events': (self.CALENDAR_PATH, self._parse_calendar_events),
+        }[section]
+        
+        response = self._get(path)
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        
+        if body_hash == known_hash:
+            return body_hash, None
+        return body_hash, parse(response.text)
+
+    def get_schedule(self, revalidate: bool = False) -> Dict[str, List[Lesson]]:
+        """Get the weekly schedule from planlekcji"""
+        return self._cached(
+            self.SCHEDULE_PATH,
+            self._parse_schedule,
+            convert_schedule_to_dict,
+            convert_dict_to_schedule,
+            revalidate
+        )
+
+    def _parse_schedule(self, html_content: str) -> Dict[str, List[Lesson]]:
+        """Parse the planlekcji page into lessons grouped by weekday"""
+        with self._phase('parse_schedule'):
+            return self._parse_schedule_cells(html_content)
+
+    def _parse_schedule_cells(self, html_content: str) -> Dict[str, List[Lesson]]:
+        cells = _ScheduleScanner.scan(html_content)
+        
+        if cells is None:
             raise Exception("Unable to find schedule content")
 
         schedule: Dict[str, List[Lesson]] = {day: [] for day in self.WEEKDAYS}
         
-        for div in schedule_cnt.find_all('div', class_='plansc_cnt_w'):
-            first_div = div.find('div', recursive=False)
-            if not first_div:
+        for first_div in cells:
+            if first_div is None:
                 continue
                 
             style = first_div.get('style', '')
@@ -326,13 +1155,20 @@ class MobiClient:
             
         return schedule
 
-    def get_calendar_events(self) -> List[CalendarEvent]:
+    def get_calendar_events(self, revalidate: bool = False) -> List[CalendarEvent]:
         """Get calendar events from kalendarzklasowy"""
-        response = self.session.get(f"{self.BASE_URL}/kalendarzklasowy")
-        response.raise_for_status()
-        
-        events = self._extract_calendar_events(response.text)
-        return sorted(events, key=lambda x: x.date)
+        return self._cached(
+            self.CALENDAR_PATH,
+            self._parse_calendar_events,
+            convert_events_to_dict,
+            convert_dict_to_events,
+            revalidate
+        )
+
+    def _parse_calendar_events(self, html_content: str) -> List[CalendarEvent]:
+        with self._phase('parse_calendar'):
+            events = self._extract_calendar_events(html_content)
+            return sorted(events, key=lambda x: x.date)
 
 def convert_schedule_to_dict(schedule: Dict[str, List[Lesson]]) -> dict:
     """Convert schedule to a dictionary suitable for JSON serialization"""
@@ -345,42 +1181,754 @@ def convert_events_to_dict(events: List[CalendarEvent]) -> list:
     """Convert events to a list suitable for JSON serialization"""
     return [asdict(event) for event in events]
 
+def convert_dict_to_schedule(data: dict) -> Dict[str, List[Lesson]]:
+    """Rebuild a schedule from its serialized form"""
+    return {
+        day: [Lesson(**lesson) for lesson in lessons]
+        for day, lessons in data.items()
+    }
+
+def convert_dict_to_events(data: list) -> List[CalendarEvent]:
+    """Rebuild events from their serialized form"""
+    return [CalendarEvent(**event) for event in data]
+
+class EventStore:
+    """Local SQLite index of lessons and events, refreshed by sync().
+
+    Rows are upserted on every sync and stamped with the time they were last
+    seen; rows missing from the latest sync are kept for reference but no
+    longer returned by queries.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS events (
+            account TEXT NOT NULL,
+            key TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            title TEXT,
+            description TEXT,
+            event_id,
+            color TEXT,
+            event_type TEXT,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            PRIMARY KEY (account, key)
+        );
+        CREATE INDEX IF NOT EXISTS events_date ON events (account, date);
+        CREATE INDEX IF NOT EXISTS events_type ON events (account, event_type, date);
+        
+        CREATE TABLE IF NOT EXISTS lessons (
+            account TEXT NOT NULL,
+            weekday TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            id INTEGER NOT NULL,
+            time TEXT,
+            subject TEXT,
+            teacher TEXT,
+            location TEXT,
+            status TEXT,
+            first_seen REAL NOT NULL,
+            last_seen REAL NOT NULL,
+            PRIMARY KEY (account, weekday, position)
+        );
+        CREATE INDEX IF NOT EXISTS lessons_weekday ON lessons (account, weekday, id);
+        
+        CREATE TABLE IF NOT EXISTS syncs (
+            account TEXT NOT NULL,
+            section TEXT NOT NULL,
+            synced_at REAL NOT NULL,
+            PRIMARY KEY (account, section)
+        );
+    """
+    
+    def __init__(self, path: str, account: str):
+        self.path = path
+        self.account = account
+        self._syncing = False
+        self._syncing_lock = threading.Lock()
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection for a single transaction.
+
+        One connection per operation keeps the store safe to use from the
+        daemon's background sync thread.
+        """
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def synced_at(self, section: str) -> Optional[float]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT synced_at FROM syncs WHERE account = ? AND section = ?",
+                (self.account, section)
+            ).fetchone()
+        return row['synced_at'] if row else None
+
+    def sync(self, client: MobiClient, schedule: bool = True, calendar: bool = True) -> dict:
+        """Fetch the requested sections and upsert them into the store"""
+        # Results not confirmed by the server just now (stale ones, or a
+        # cached page within its TTL) would be stamped as seen now
+        fetched = fetch(client, schedule, calendar, objects=True, stale=False, revalidate=True)
+        now = time.time()
+        counts = {}
+        
+        with self._connect() as conn:
+            if 'schedule' in fetched:
+                rows = [
+                    (self.account, day, position, lesson.id, lesson.time, lesson.subject,
+                     lesson.teacher, lesson.location, lesson.status, now, now)
+                    for day, lessons in fetched['schedule'].items()
+                    for position, lesson in enumerate(lessons)
+                ]
+                conn.executemany("""
+                    INSERT INTO lessons (account, weekday, position, id, time, subject,
+                                         teacher, location, status, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (account, weekday, position) DO UPDATE SET
+                        id = excluded.id, time = excluded.time, subject = excluded.subject,
+                        teacher = excluded.teacher, location = excluded.location,
+                        status = excluded.status, last_seen = excluded.last_seen
+                """, rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO syncs (account, section, synced_at) VALUES (?, 'schedule', ?)",
+                    (self.account, now)
+                )
+                counts['lessons'] = len(rows)
+            
+            if 'events' in fetched:
+                rows = [
+                    (self.account, event_key(event), position, event.date, event.title,
+                     event.description, event.event_id, event.color, event.event_type, now, now)
+                    for position, event in enumerate(fetched['events'])
+                ]
+                conn.executemany("""
+                    INSERT INTO events (account, key, position, date, title, description,
+                                        event_id, color, event_type, first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (account, key) DO UPDATE SET
+                        position = excluded.position, date = excluded.date,
+                        title = excluded.title, description = excluded.description,
+                        event_id = excluded.event_id, color = excluded.color,
+                        event_type = excluded.event_type, last_seen = excluded.last_seen
+                """, rows)
+                conn.execute(
+                    "INSERT OR REPLACE INTO syncs (account, section, synced_at) VALUES (?, 'events', ?)",
+                    (self.account, now)
+                )
+                counts['events'] = len(rows)
+        
+        result = {'synced': counts, 'synced_at': now}
+        if 'errors' in fetched:
+            result['errors'] = fetched['errors']
+        return result
+
+    def sync_in_background(self, client: MobiClient, schedule: bool, calendar: bool) -> None:
+        """Start a sync in a daemon thread, unless one is already running"""
+        with self._syncing_lock:
+            if self._syncing:
+                return
+            self._syncing = True
+        
+        def run():
+            try:
+                self.sync(client, schedule, calendar)
+            except Exception as e:
+                print(f"Warning: Background sync failed: {e}", file=sys.stderr)
+            finally:
+                with self._syncing_lock:
+                    self._syncing = False
+        
+        threading.Thread(target=run, daemon=True).start()
+
+    def read(self, schedule: bool, calendar: bool, query: Optional[Query] = None) -> dict:
+        """Answer a query from the store, in the same shape as fetch().
+
+        When each section was last synced is returned under "synced_at".
+        """
+        result = {}
+        
+        with self._connect() as conn:
+            synced_at = dict(conn.execute(
+                "SELECT section, synced_at FROM syncs WHERE account = ?",
+                (self.account,)
+            ).fetchall())
+            
+            if schedule:
+                sql = """
+                    SELECT lessons.* FROM lessons JOIN syncs
+                        ON syncs.account = lessons.account AND syncs.section = 'schedule'
+                    WHERE lessons.account = ? AND lessons.last_seen >= syncs.synced_at
+                """
+                params: list = [self.account]
+                days = MobiClient.WEEKDAYS
+                
+                if query and query.weekday:
+                    sql += " AND lessons.weekday = ?"
+                    params.append(query.weekday)
+                    days = [day for day in days if day == query.weekday]
+                
+                lessons = {day: [] for day in days}
+                for row in conn.execute(sql + " ORDER BY lessons.id, lessons.position", params):
+                    lessons.setdefault(row['weekday'], []).append({
+                        'id': row['id'],
+                        'time': row['time'],
+                        'subject': row['subject'],
+                        'teacher': row['teacher'],
+                        'location': row['location'],
+                        'status': row['status'],
+                        'weekday': row['weekday'],
+                    })
+                result['schedule'] = lessons
+            
+            if calendar:
+                where = """
+                    FROM events JOIN syncs
+                        ON syncs.account = events.account AND syncs.section = 'events'
+                    WHERE events.account = ? AND events.last_seen >= syncs.synced_at
+                """
+                params = [self.account]
+                
+                if query:
+                    total = conn.execute("SELECT COUNT(*) " + where, params).fetchone()[0]
+                    
+                    if query.date_from:
+                        where += " AND events.date >= ?"
+                        params.append(query.date_from)
+                    if query.date_to:
+                        # Dates may carry a time after the YYYY-MM-DD part
+                        where += " AND events.date < ?"
+                        params.append(query.date_to + "\uffff")
+                    if query.event_types:
+                        where += f" AND events.event_type IN ({', '.join('?' * len(query.event_types))})"
+                        params.extend(query.event_types)
+                
+                sql = "SELECT events.* " + where + " ORDER BY events.date, events.position"
+                if query and query.limit is not None:
+                    sql += " LIMIT ?"
+                    params.append(query.limit)
+                
+                result['events'] = [
+                    {
+                        'date': row['date'],
+                        'title': row['title'],
+                        'description': row['description'],
+                        'event_id': row['event_id'],
+                        'color': row['color'],
+                        'event_type': row['event_type'],
+                    }
+                    for row in conn.execute(sql, params)
+                ]
+                if query:
+                    result['total_events'] = total
+        
+        result['synced_at'] = {
+            section: synced_at[section]
+            for section, wanted in (('schedule', schedule), ('events', calendar))
+            if wanted and section in synced_at
+        }
+        return result
+
+class ChangeTracker:
+    """Remembers the last seen lessons and events to report only what changed.
+
+    Lessons are keyed by weekday and lesson id, events by event_id. Raw page
+    hashes are kept too, so an unchanged page is not parsed at all.
+    """
+    
+    def __init__(self, path: str, account: str):
+        self.path = path
+        self.account = account
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def _lesson_items(schedule: Dict[str, List[Lesson]]) -> Dict[str, dict]:
+        items = {}
+        for day, lessons in schedule.items():
+            for lesson in lessons:
+                key = f"{day}:{lesson.id}"
+                # Several lessons can share a slot (e.g. split groups)
+                suffix = 2
+                while key in items:
+                    key = f"{day}:{lesson.id}#{suffix}"
+                    suffix += 1
+                items[key] = asdict(lesson)
+        return items
+
+    @staticmethod
+    def _event_items(events: List[CalendarEvent]) -> Dict[str, dict]:
+        return {event_key(event): asdict(event) for event in events}
+
+    @staticmethod
+    def _diff(before: Dict[str, dict], after: Dict[str, dict]) -> dict:
+        return {
+            'added': [after[key] for key in after if key not in before],
+            'removed': [before[key] for key in before if key not in after],
+            'changed': [
+                {'key': key, 'before': before[key], 'after': after[key]}
+                for key in after
+                if key in before and before[key] != after[key]
+            ],
+        }
+
+    def poll(self, client: MobiClient, schedule: bool = True, calendar: bool = True) -> dict:
+        """Fetch the sections and return what changed since the previous poll"""
+        data = self._load()
+        state = data.get(self.account, {})
+        
+        sections = []
+        if schedule:
+            sections.append(('schedule', self._lesson_items))
+        if calendar:
+            sections.append(('events', self._event_items))
+        
+        with client.budget() as deadline_at, ThreadPoolExecutor(max_workers=len(sections)) as pool:
+            futures = {
+                name: pool.submit(client.call_within, deadline_at, client.fetch_if_changed,
+                                  name, state.get(name, {}).get('hash'))
+                for name, _ in sections
+            }
+        
+        result = {}
+        errors = {}
+        
+        for name, to_items in sections:
+            try:
+                body_hash, parsed = futures[name].result()
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            
+            previous = state.get(name)
+            if parsed is None:
+                result[name] = self._diff({}, {})
+                continue
+            
+            items = to_items(parsed)
+            result[name] = self._diff(previous['items'] if previous else {}, items)
+            if not previous:
+                # Everything is "added" on the first poll
+                result[name]['initial'] = True
+            
+            state[name] = {'hash': body_hash, 'items': items}
+        
+        if not result:
+            raise Exception(next(iter(errors.values())))
+        
+        data[self.account] = state
+        try:
+            _write_private_json(self.path, data)
+        except OSError as e:
+            print(f"Warning: Failed to save change snapshot: {e}", file=sys.stderr)
+        
+        if errors:
+            result['errors'] = errors
+        return result
+
+def fetch_stored(client: MobiClient, store: EventStore, schedule: bool, calendar: bool,
+                 query: Optional[Query] = None) -> dict:
+    """Answer from the local store, syncing first any section that was never synced.
+
+    A section synced longer ago than its page's CACHE_TTL is synced again:
+    in the background when the client does background refreshes (the store
+    answers meanwhile), else before answering.
+    """
+    missing = set()
+    outdated = set()
+    
+    for section, wanted, path in (('schedule', schedule, client.SCHEDULE_PATH),
+                                  ('events', calendar, client.CALENDAR_PATH)):
+        if not wanted:
+            continue
+        synced_at = store.synced_at(section)
+        if synced_at is None:
+            missing.add(section)
+        elif time.time() - synced_at >= client.CACHE_TTL[path]:
+            outdated.add(section)
+    
+    if missing:
+        store.sync(client, 'schedule' in missing, 'events' in missing)
+    
+    if outdated and client.background_refresh:
+        store.sync_in_background(client, 'schedule' in outdated, 'events' in outdated)
+    elif outdated:
+        try:
+            store.sync(client, 'schedule' in outdated, 'events' in outdated)
+        except Exception as e:
+            # The store still has the last synced answer
+            print(f"Warning: Failed to sync the store: {e}", file=sys.stderr)
+    
+    with client._phase('store_read'):
+        return store.read(schedule, calendar, query)
+
+def fetch(client: MobiClient, schedule: bool, calendar: bool, query: Optional[Query] = None,
+          objects: bool = False, stale: bool = True, revalidate: bool = False) -> dict:
+    """Fetch the requested sections and convert them for JSON serialization.
+
+    The query filters are applied before conversion; with objects=True the
+    Lesson and CalendarEvent objects are returned unconverted. When both
+    sections are requested they are fetched concurrently over the shared
+    session, and a failing section is reported under "errors" instead of
+    discarding the other one. Everything runs within one deadline budget
+    of the client; if the server is too slow or unreachable, the last good
+    result of a section is returned instead (unless stale=False), with
+    "stale": true and its age in seconds under "stale_age". With
+    revalidate=True cached pages are checked with the server before use.
+    """
+    def get_or_stale(get: Callable[[], Any], path: str, load: Callable[[Any], Any]) -> Tuple[Any, Optional[float]]:
+        try:
+            return get(), None
+        except (DeadlineExceeded, requests.RequestException) as e:
+            last_good = client.last_good(path, load) if stale else None
+            if last_good is None:
+                raise
+            print(f"Warning: Serving stale {client.SECTIONS[path]}: {e}", file=sys.stderr)
+            return last_good
+    
+    def get_schedule():
+        lessons, age = get_or_stale(lambda: client.get_schedule(revalidate),
+                                    client.SCHEDULE_PATH, convert_dict_to_schedule)
+        client._count('lessons', sum(len(day) for day in lessons.values()))
+        with client._phase('convert'):
+            lessons = filter_schedule(lessons, query)
+            return {'schedule': lessons if objects else convert_schedule_to_dict(lessons)}, age
+    
+    def get_events():
+        events, age = get_or_stale(lambda: client.get_calendar_events(revalidate),
+                                   client.CALENDAR_PATH, convert_dict_to_events)
+        client._count('events', len(events))
+        with client._phase('convert'):
+            selected = filter_events(events, query)
+            result = {'events': selected if objects else convert_events_to_dict(selected)}
+        if query:
+            result['total_events'] = len(events)
+        return result, age
+    
+    sections = {}
+    
+    if schedule:
+        sections['schedule'] = get_schedule
+    
+    if calendar:
+        sections['events'] = get_events
+    
+    outcomes = {}
+    errors = {}
+    
+    with client.budget() as deadline_at:
+        if len(sections) == 1:
+            key, task = next(iter(sections.items()))
+            outcomes[key] = task()
+        else:
+            with ThreadPoolExecutor(max_workers=len(sections)) as pool:
+                futures = {key: pool.submit(client.call_within, deadline_at, task) for key, task in sections.items()}
+            
+            for key, future in futures.items():
+                try:
+                    outcomes[key] = future.result()
+                except Exception as e:
+                    errors[key] = e
+    
+    if not outcomes:
+        raise next(iter(errors.values()))
+    
+    result = {}
+    stale_age = {}
+    
+    for key, (section, age) in outcomes.items():
+        result.update(section)
+        if age is not None:
+            stale_age[key] = round(age)
+    
+    if stale_age:
+        result['stale'] = True
+        result['stale_age'] = stale_age
+    
+    if errors:
+        result['errors'] = {key: str(e) for key, e in errors.items()}
+    
+    return result
+
+# Daemon commands and the sections (schedule, calendar) they fetch
+SERVE_COMMANDS = {
+    "schedule": (True, False),
+    "calendar": (False, True),
+    "both": (True, True),
+    "sync": (True, True),
+    "changes": (True, True),
+}
+
+def answer(client: MobiClient, store: Optional[EventStore], schedule: bool, calendar: bool,
+           query: Optional[Query] = None) -> dict:
+    """Answer a query from the local store when one is configured, else from the server"""
+    if store:
+        return fetch_stored(client, store, schedule, calendar, query)
+    return fetch(client, schedule, calendar, query)
+
+def _sync_periodically(client: MobiClient, store: EventStore, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            store.sync(client)
+        except Exception as e:
+            print(f"Warning: Background sync failed: {e}", file=sys.stderr)
+
+def serve(client: MobiClient, store: Optional[EventStore] = None,
+          sync_interval: Optional[float] = None, tracker: Optional[ChangeTracker] = None,
+          profile: bool = False) -> None:
+    """Answer newline-delimited JSON commands on stdin with one JSON line each.
+
+    A request looks like {"id": 1, "command": "schedule"}; the id is echoed
+    back so callers can match responses to requests. The optional "day",
+    "from", "to", "type" and "limit" keys filter the result like the CLI
+    options of the same name. With a store, queries are answered from it,
+    the "sync" command refreshes it, and it is re-synced every sync_interval
+    seconds in the background. With a tracker, the "changes" command
+    reports what changed since it was last sent. With profile, every
+    request's timings are printed to stderr under its id.
+    """
+    client.background_refresh = True
+    
+    if store and sync_interval:
+        threading.Thread(
+            target=_sync_periodically,
+            args=(client, store, sync_interval),
+            daemon=True
+        ).start()
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        
+        request = {}
+        if profile:
+            client.profile = Profiler()
+        
+        try:
+            request = json.loads(line)
+            command = request.get('command', 'schedule')
+            if command not in SERVE_COMMANDS:
+                raise Exception(f"Unknown command: {command}")
+            
+            query = make_query(
+                request.get('day'),
+                request.get('from'),
+                request.get('to'),
+                request.get('type'),
+                request.get('limit')
+            )
+            if command == 'sync':
+                if not store:
+                    raise Exception("The sync command needs --db")
+                response = store.sync(client)
+            elif command == 'changes':
+                if not tracker:
+                    raise Exception("The changes command needs --changes")
+                response = tracker.poll(client)
+            else:
+                response = answer(client, store, *SERVE_COMMANDS[command], query)
+        except Exception as e:
+            response = {"error": str(e)}
+        
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        
+        with client._phase('serialize'):
+            output = json.dumps(response, ensure_ascii=False)
+        print(output, flush=True)
+        
+        if client.profile:
+            client.profile.count('output_bytes', len(output.encode('utf-8')))
+            client.profile.emit(id=response.get('id'))
+
+def load_accounts(path: str) -> List[dict]:
+    """Read batch accounts: a JSON list of {"user", "password", "base_url", "name"} ("-" for stdin)"""
+    if path == '-':
+        data = json.load(sys.stdin)
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    
+    if not isinstance(data, list) or not all(
+        isinstance(account, dict) and account.get('user') and account.get('password')
+        for account in data
+    ):
+        raise Exception("Accounts must be a JSON list of objects with user and password")
+    return data
+
+def share_connections(clients: List[MobiClient], pool_size: int) -> None:
+    """Send the requests of all clients for the same host through one connection pool.
+
+    Cookies stay in each client's session; only the keep-alive connections
+    (and their TLS handshakes) are shared.
+    """
+    adapters: Dict[str, requests.adapters.HTTPAdapter] = {}
+    
+    for client in clients:
+        url = urlsplit(client.base_url)
+        prefix = f"{url.scheme}://{url.netloc}/"
+        if prefix not in adapters:
+            adapters[prefix] = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        client.session.mount(prefix, adapters[prefix])
+
+def batch(accounts: List[Tuple[str, MobiClient, Optional[EventStore]]], schedule: bool, calendar: bool,
+          query: Optional[Query] = None, concurrency: int = 4, profile: bool = False) -> int:
+    """Answer a query for several (name, client, store) accounts, at most concurrency at a time.
+
+    Each account's result is printed as one JSON line, tagged with its
+    "account" name, as soon as it finishes. Returns the number of accounts
+    that failed.
+    """
+    # Each account fetches up to two pages at once
+    share_connections([client for _, client, _ in accounts], concurrency * 2)
+    
+    def run(name: str, client: MobiClient, store: Optional[EventStore]) -> dict:
+        if profile:
+            client.profile = Profiler()
+        try:
+            return {"account": name, **answer(client, store, schedule, calendar, query)}
+        except Exception as e:
+            return {"account": name, "error": str(e)}
+    
+    failed = 0
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(run, *account): account for account in accounts}
+        
+        for future in as_completed(futures):
+            result = future.result()
+            failed += 'error' in result
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+            
+            client = futures[future][1]
+            if client.profile:
+                client.profile.emit(account=result['account'])
+    
+    return failed
+
 def main():
+    profile = Profiler()
+    startup = _process_age()
+    if startup is not None:
+        # Interpreter start and imports, up to here
+        profile.add('startup', startup)
+    
     parser = argparse.ArgumentParser(description="Get schedule and calendar from MobiDziennik")
-    parser.add_argument('-u', '--user', required=True, help='Username/email')
-    parser.add_argument('-p', '--password', required=True, help='Password')
+    parser.add_argument('-u', '--user', help='Username/email')
+    parser.add_argument('-p', '--password', help='Password')
     parser.add_argument('--schedule', action='store_true', help='Get weekly schedule')
     parser.add_argument('--calendar', action='store_true', help='Get calendar events')
     parser.add_argument('--pretty', action='store_true', help='Pretty print JSON output')
+    parser.add_argument('--day', help="Only this day: today, tomorrow, dayaftertomorrow, a weekday or YYYY-MM-DD")
+    parser.add_argument('--from', dest='date_from', help='Only events on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--to', dest='date_to', help='Only events on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--type', dest='event_types', help='Only these event types, comma-separated (e.g. quiz,test)')
+    parser.add_argument('--limit', type=int, help='Return at most this many events')
+    parser.add_argument('--base-url', default=os.getenv('MOBI_BASE_URL') or None,
+                        help=f'School diary URL (default: {MobiClient.BASE_URL})')
+    parser.add_argument('--session-file', default=os.getenv('MOBI_SESSION_FILE'),
+                        help='Reuse session cookies stored in this file between runs')
+    parser.add_argument('--cache-dir', default=os.getenv('MOBI_CACHE_DIR'),
+                        help='Cache parsed pages in this directory')
+    parser.add_argument('--db', default=os.getenv('MOBI_DB'),
+                        help='Answer queries from this local SQLite store (synced on first use)')
+    parser.add_argument('--sync', action='store_true', help='Refresh the local store (--db) and exit')
+    parser.add_argument('--sync-interval', type=float, default=os.getenv('MOBI_SYNC_INTERVAL') or None,
+                        help='With --serve and --db, re-sync the store every this many seconds')
+    parser.add_argument('--changes', metavar='STATE_FILE',
+                        help='Print only what changed since the previous run, remembered in STATE_FILE')
+    parser.add_argument('--serve', action='store_true', help='Keep the session open and answer JSON-lines commands on stdin')
+    parser.add_argument('--accounts', metavar='FILE',
+                        help='Batch mode: JSON list of {"user", "password", "base_url", "name"} accounts ("-" for stdin); '
+                             'prints one JSON line per account as it finishes')
+    parser.add_argument('--concurrency', type=int, default=4, help='With --accounts, fetch this many accounts at a time')
+    parser.add_argument('--deadline', type=float, default=os.getenv('MOBI_DEADLINE') or None,
+                        help='Seconds a fetch may take in total; past it the last good result is returned as stale')
+    parser.add_argument('--profile', action='store_true', default=bool(os.getenv('MOBI_PROFILE')),
+                        help='Print per-phase timings and counts as one JSON line on stderr')
     
     args = parser.parse_args()
     
+    if not args.accounts and not (args.user and args.password):
+        parser.error("-u/--user and -p/--password are required without --accounts")
+    
+    if args.accounts and (args.serve or args.sync or args.changes):
+        parser.error("--accounts cannot be combined with --serve, --sync or --changes")
+    
     # Default to schedule if neither specified
     if not args.schedule and not args.calendar:
         args.schedule = True
     
     try:
-        client = MobiClient(args.user, args.password)
-        result = {}
+        query = make_query(args.day, args.date_from, args.date_to, args.event_types, args.limit)
+        
+        if args.accounts:
+            accounts = []
+            for account in load_accounts(args.accounts):
+                client = MobiClient(account['user'], account['password'], args.session_file, args.cache_dir,
+                                    account.get('base_url') or args.base_url, args.deadline)
+                store = EventStore(args.db, client.account) if args.db else None
+                accounts.append((account.get('name') or account['user'], client, store))
+            
+            if batch(accounts, args.schedule, args.calendar, query, max(1, args.concurrency), args.profile):
+                sys.exit(1)
+            return
         
-        if args.schedule:
-            schedule = client.get_schedule()
-            result['schedule'] = convert_schedule_to_dict(schedule)
+        client = MobiClient(args.user, args.password, args.session_file, args.cache_dir,
+                            args.base_url, args.deadline)
+        if args.profile:
+            client.profile = profile
+        store = EventStore(args.db, client.account) if args.db else None
+        tracker = ChangeTracker(args.changes, client.account) if args.changes else None
         
-        if args.calendar:
-            events = client.get_calendar_events()
-            result['events'] = convert_events_to_dict(events)
+        if args.sync and not store:
+            raise Exception("--sync needs --db")
         
-        # Use ensure_ascii=False to properly output UTF-8 characters
-        if args.pretty:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+        if args.serve:
+            serve(client, store, args.sync_interval, tracker, args.profile)
+            return
+        
+        if args.sync:
+            result = store.sync(client)
+        elif tracker:
+            result = tracker.poll(client, args.schedule, args.calendar)
         else:
-            print(json.dumps(result, ensure_ascii=False))
+            result = answer(client, store, args.schedule, args.calendar, query)
+        
+        # Use ensure_ascii=False to properly output UTF-8 characters
+        with profile.phase('serialize'):
+            if args.pretty:
+                output = json.dumps(result, indent=2, ensure_ascii=False)
+            else:
+                output = json.dumps(result, ensure_ascii=False)
+        print(output)
+        profile.count('output_bytes', len(output.encode('utf-8')))
             
     except Exception as e:
         error_dict = {"error": str(e)}
         print(json.dumps(error_dict, ensure_ascii=False), file=sys.stderr)
         sys.exit(1)
+    finally:
+        if args.profile and not args.serve and not args.accounts:
+            profile.emit()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
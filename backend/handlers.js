@@ -1046,6 +1046,10 @@ export function setup(mainWindow) {
                     forwardEvent("wake");
                 }
             });
+            // Periodic detector metrics (WAKE_STATS_INTERVAL) for tuning
+            wake.on("stats", (data) => forwardEvent("stats", data));
+            // Startup phase timings (STARTUP line), once per detector start
+            wake.on("startup", (data) => forwardEvent("startup", data));
 
             return { success: true };
         } catch (error) {
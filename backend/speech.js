@@ -5,6 +5,8 @@ import record from "node-record-lpcm16";
 // TTS
 import OpenAI from "openai";
 import { spawn } from "child_process";
+import net from "net";
+import { AUDIO_SOCKET } from "./wake.js";
 
 const TTS_INSTRUCTIONS = `You are a voice assistant speaking in a clear, neutral tone. Your voice should sound calm, concise, and slightly warm — welcoming, but not overly emotional or enthusiastic. Avoid exaggerated inflection. Maintain a natural, human cadence, with subtle pauses where appropriate. Your delivery should be helpful and attentive, without sounding robotic or monotone.`;
 
@@ -44,6 +46,7 @@ export function transcribeStream(onTranscript, onFinalResult) {
     let audioStream;
     let recognizeStream;
     let audioProcess = null;
+    let hubSocket = null;
 
     // Initialize variables for tracking speech
     let lastSpokenTime = Date.now();
@@ -72,52 +75,85 @@ export function transcribeStream(onTranscript, onFinalResult) {
             }
         });
 
-    if (process.env.NODE_ENV === "production") {
-        // In production, use direct arecord spawn
-        audioProcess = spawn("arecord", [
-            "-D", "plug:shared_mic", // Use the specific audio device
-            "-f", "S16_LE",
-            "-r", "16000",
-            "-c", "1",
-            "-t", "raw",
-        ]);
-
-        audioProcess.stderr.on("data", (err) => {
-            console.error("arecord error:", err.toString());
-        });
-
-        audioProcess.on("exit", (code) => {
-            console.log("arecord exited with code", code);
-        });
+    // Capture the microphone ourselves when the wake detector's hub is not running
+    const startLocalCapture = () => {
+        if (process.env.NODE_ENV === "production") {
+            // In production, use direct arecord spawn
+            audioProcess = spawn("arecord", [
+                "-D", "plug:shared_mic", // Use the specific audio device
+                "-f", "S16_LE",
+                "-r", "16000",
+                "-c", "1",
+                "-t", "raw",
+            ]);
+
+            audioProcess.stderr.on("data", (err) => {
+                console.error("arecord error:", err.toString());
+            });
+
+            audioProcess.on("exit", (code) => {
+                console.log("arecord exited with code", code);
+            });
+
+            // Pipe arecord output to Google STT
+            audioProcess.stdout.pipe(recognizeStream);
+        } else {
+            // In development, use node-record-lpcm16
+            audioStream = record
+                .record({
+                    channels: 1, // Mono audio
+                    audioType: "raw", // Raw PCM data
+                    sampleRateHertz: 16000,
+                    threshold: 0, // Silence threshold
+                    verbose: false,
+                    recordProgram: "rec", // Use 'rec' for development
+                    recorder: "sox",
+                    device: null, // No specific device in development
+                })
+                .stream()
+                .on("error", console.error);
+
+            // Pipe the audio stream to the recognition stream
+            audioStream.pipe(recognizeStream);
+        }
+    };
 
-        // Pipe arecord output to Google STT
-        audioProcess.stdout.pipe(recognizeStream);
-    } else {
-        // In development, use node-record-lpcm16
-        audioStream = record
-            .record({
-                channels: 1, // Mono audio
-                audioType: "raw", // Raw PCM data
-                sampleRateHertz: 16000,
-                threshold: 0, // Silence threshold
-                verbose: false,
-                recordProgram: "rec", // Use 'rec' for development
-                recorder: "sox",
-                device: null, // No specific device in development
-            })
-            .stream()
-            .on("error", console.error);
-
-        // Pipe the audio stream to the recognition stream
-        audioStream.pipe(recognizeStream);
-    }
+    // Prefer the wake detector's audio hub: it is the only process capturing
+    // the microphone, and it hands over the audio from just before the end of
+    // the wake word, so nothing said right after "Apollo" is lost
+    let hubConnected = false;
+    let listening = true;
+    hubSocket = net.createConnection(AUDIO_SOCKET);
+    hubSocket.once("connect", () => {
+        hubConnected = true;
+        hubSocket.write("WAKE\n");
+        // Keep the recognition stream open if the hub goes away mid-utterance
+        hubSocket.pipe(recognizeStream, { end: false });
+    });
+    hubSocket.on("error", (err) => {
+        if (hubConnected) console.error("audio hub error:", err.message);
+    });
+    hubSocket.on("close", () => {
+        // The hub is not running, or dropped us (crash, restart, falling
+        // behind) before the user finished: capture the rest ourselves
+        if (!listening) return;
+        if (hubConnected) console.log("audio hub closed, capturing locally");
+        hubSocket.unpipe(recognizeStream);
+        hubSocket = null;
+        startLocalCapture();
+    });
 
     // Monitor silence
     const silenceChecker = setInterval(() => {
         if (Date.now() - lastSpokenTime > silenceTimeout) {
             clearInterval(silenceChecker); // Stop checking for silence
+            listening = false;
 
             // End recognition and stop recording
+            if (hubSocket) {
+                hubSocket.unpipe(recognizeStream);
+                hubSocket.destroy();
+            }
             recognizeStream.end();
             if (audioStream) audioStream.destroy();
             if (audioProcess) audioProcess.kill();
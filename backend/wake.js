@@ -2,6 +2,17 @@
 
 import {spawn} from "child_process";
 import EventEmitter from "events";
+import os from "os";
+import path from "path";
+
+// Unix socket on which the detector serves the microphone audio it captures
+// (see AudioHub in main.py); speech.js reads STT audio from it
+export const AUDIO_SOCKET =
+    process.env.WAKE_AUDIO_SOCKET ||
+    path.join(os.tmpdir(), `apollo-audio-${process.getuid?.() ?? 0}.sock`);
+
+// Milliseconds stats() waits for the detector to answer
+const STATS_TIMEOUT = 2000;
 
 export default class WakeWord extends EventEmitter {
     constructor(config = {}) {
@@ -13,9 +24,19 @@ export default class WakeWord extends EventEmitter {
         this.pythonPath =
             config.pythonPath ||
             (process.platform === "win32" ? "python" : "python3");
-        this.paused = false;
+        this._paused = false;
         this.process = null;
 
+        // Supervised mode (WAKE_STANDBY=1): a second detector loads its model
+        // and waits warm; when the active one dies it is promoted with START,
+        // so recovery skips the model load. Costs a second copy of the model
+        // in memory.
+        this.supervise =
+            config.standby ?? process.env.WAKE_STANDBY === "1";
+        this.standby = null;
+        this._stopping = false;
+        this._restarts = [];
+
         // Bind cleanup to process events
         process.on("exit", () => this._cleanup());
         process.on("SIGINT", () => process.exit());
@@ -23,27 +44,152 @@ export default class WakeWord extends EventEmitter {
         process.on("uncaughtException", () => process.exit());
     }
 
+    // While paused the detector stops decoding (frees CPU for STT/TTS);
+    // resuming resets its recognizer so no stale audio triggers a wake
+    get paused() {
+        return this._paused;
+    }
+
+    set paused(value) {
+        value = Boolean(value);
+        if (value === this._paused) return;
+        this._paused = value;
+        this.send(value ? "PAUSE" : "RESUME");
+    }
+
+    send(command) {
+        if (this.process?.stdin.writable) {
+            this.process.stdin.write(command + "\n");
+        }
+    }
+
+    reset() {
+        this.send("RESET");
+    }
+
+    // Resolves with the detector's counters (see control_thread in main.py),
+    // or with null if it exits or does not answer within STATS_TIMEOUT ms
+    stats() {
+        const child = this.process;
+        if (!child) return Promise.resolve(null);
+        return new Promise((resolve) => {
+            const done = (stats) => {
+                clearTimeout(timer);
+                this.off("stats", done);
+                child.off("exit", exited);
+                resolve(stats);
+            };
+            const exited = () => done(null);
+            const timer = setTimeout(done, STATS_TIMEOUT, null);
+            this.on("stats", done);
+            child.on("exit", exited);
+            this.send("STATS");
+        });
+    }
+
     start() {
-        this.process = spawn(this.pythonPath, [this.scriptPath]);
-        this.process.stdout.on("data", (data) => {
-            const output = data.toString().trim();
-            if (output.includes("WAKE") && !this.paused) {
-                this.emit("wake");
-                this.paused = true;
+        this._stopping = false;
+        this._activate(this._spawn([]));
+    }
+
+    stop() {
+        this._stopping = true;
+        this._cleanup();
+    }
+
+    _spawn(args) {
+        const child = spawn(this.pythonPath, [this.scriptPath, ...args], {
+            env: {...process.env, WAKE_AUDIO_SOCKET: AUDIO_SOCKET},
+        });
+        child.warm = false;
+
+        let buffer = "";
+        child.stdout.on("data", (data) => {
+            buffer += data.toString();
+
+            let newline;
+            while ((newline = buffer.indexOf("\n")) !== -1) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+
+                if (line === "WARM") {
+                    child.warm = true;
+                    continue;
+                }
+                // Only the active detector speaks for us
+                if (child !== this.process) continue;
+
+                if (line === "WAKE" && !this.paused) {
+                    this.emit("wake");
+                    this.paused = true;
+                } else if (line === "READY") {
+                    this.emit("ready");
+                    // Warm the next standby once this one no longer
+                    // competes with it for CPU
+                    if (this.supervise && !this.standby) {
+                        this.standby = this._spawn(["--standby"]);
+                    }
+                } else if (line.startsWith("STARTUP ")) {
+                    try {
+                        this.emit("startup", JSON.parse(line.slice(8)));
+                    } catch {}
+                } else if (line.startsWith("STATS ")) {
+                    try {
+                        this.emit("stats", JSON.parse(line.slice(6)));
+                    } catch {}
+                }
             }
         });
+
+        child.on("exit", (code, signal) => this._exited(child, code, signal));
+        return child;
     }
 
-    stop() {
-        this.process.kill();
+    _activate(child) {
+        this.process = child;
+        // A restarted detector starts unpaused
+        if (this._paused) this.send("PAUSE");
+    }
+
+    _exited(child, code, signal) {
+        if (child === this.standby) {
+            this.standby = null;
+            return;
+        }
+        if (child !== this.process || this._stopping) return;
+
         this.process = null;
+        console.error(`Wake detector exited (${signal || code})`);
+        if (!this.supervise) return;
+
+        // Give up on a crash loop instead of spinning
+        const now = Date.now();
+        this._restarts = this._restarts.filter((t) => now - t < 60000);
+        if (this._restarts.length >= 5) {
+            console.error("Wake detector keeps crashing, not restarting it");
+            return;
+        }
+        this._restarts.push(now);
+
+        if (this.standby?.warm) {
+            const standby = this.standby;
+            this.standby = null;
+            standby.stdin.write("START\n");
+            this._activate(standby);
+        } else {
+            // No warm standby yet: start a new detector from scratch
+            this.standby?.kill();
+            this.standby = null;
+            this._activate(this._spawn([]));
+        }
     }
 
     _cleanup() {
-        if (this.process) {
-            this.process.kill("SIGTERM"); // Or "SIGKILL" if necessary
-            this.process = null;
+        for (const child of [this.process, this.standby]) {
+            child?.kill("SIGTERM"); // Or "SIGKILL" if necessary
         }
+        this.process = null;
+        this.standby = null;
     }
 }
 
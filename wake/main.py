@@ -3,14 +3,13 @@ import sys
 import json
 import queue
 import time
-import sounddevice as sd
 import numpy as np
-import noisereduce as nr
-from vosk import Model, KaldiRecognizer
 from collections import deque
+from contextlib import contextmanager
 import os
 import threading
 import subprocess
+import socket
 
 from dotenv import load_dotenv
 load_dotenv()  # take environment variables
@@ -18,13 +17,60 @@ load_dotenv()  # take environment variables
 is_prod = os.getenv("NODE_ENV") == "production"
 
 wake_words = ["apollo"]
-model = Model(lang="pl")
-rec = KaldiRecognizer(model, 16000, '["apollo", "[unk]"]')
-rec.SetWords(True)
 
-q = queue.Queue()
+# Vosk is imported and the model loaded in load_model(), not at import time.
+# WAKE_MODEL_PATH points at an unpacked model directory, which skips looking
+# the model up by language (and downloading it when it is missing).
+MODEL_PATH = os.getenv("WAKE_MODEL_PATH")
+MODEL_LANG = "pl"
+model = None
+rec = None
+WARM_UP_SECONDS = 0.5  # of silence decoded at startup, so the first real chunk isn't slow
+
+# Seconds per startup phase, reported on the STARTUP line before READY
+startup = {}
+
+# Captured chunks waiting for the decoder, as (capture time, data). When
+# decoding falls behind, QUEUE_POLICY decides: drop-oldest keeps the most
+# recent audio, drop-newest keeps what is queued, block stops reading
+# (arecord then overruns and skips audio itself)
+QUEUE_SIZE = int(os.getenv("WAKE_QUEUE_SIZE") or 32)  # chunks of 128 ms
+QUEUE_POLICY = os.getenv("WAKE_QUEUE_POLICY") or "drop-oldest"
+if QUEUE_POLICY not in ("drop-oldest", "drop-newest", "block"):
+    sys.exit(f"Unknown WAKE_QUEUE_POLICY: {QUEUE_POLICY}")
+STATS_INTERVAL = float(os.getenv("WAKE_STATS_INTERVAL") or 0)  # seconds; 0 = only on STATS
+
+capture_clock = time.monotonic
+# Clock of the confirmation window and cooldown; replay.py runs them on audio time
+wake_clock = time.time
+q = queue.Queue(maxsize=QUEUE_SIZE)
+commands = queue.SimpleQueue()
 processed_texts = set()
 
+# Control channel (commands on stdin, see control_thread)
+paused = threading.Event()  # set while the assistant talks; audio is dropped
+started_at = time.time()
+stats = {
+    "chunks_decoded": 0,
+    "chunks_dropped": 0,  # read from arecord while paused
+    "chunks_flushed": 0,  # already queued when paused
+    "chunks_overflowed": 0,  # dropped by QUEUE_POLICY
+    "queue_max": 0,
+    "decode_seconds": 0.0,
+    "audio_seconds": 0.0,
+    "preprocess_seconds": 0.0,
+    "preprocessed_seconds": 0.0,  # audio run through the denoiser/AGC
+    "chunks_gated": 0,  # skipped by the voice activity gate
+    "gate_opens": 0,
+    "wakes": 0,
+    "resets": 0,
+}
+output_lock = threading.Lock()
+# Recent capture-to-decode and capture-to-WAKE delays, in seconds
+queue_lags = deque(maxlen=200)
+wake_latencies = deque(maxlen=50)
+last_captured_at = None  # capture time of the newest chunk taken off the queue
+
 # New parameters for improved detection
 MIN_CONFIDENCE = 0.6  # Minimum confidence threshold
 WAKE_CONFIRMATION_WINDOW = 1.0  # seconds
@@ -33,20 +79,393 @@ MIN_WORD_DURATION = 0.2  # minimum duration for wake word
 
 # Track recent detections for confirmation
 recent_detections = deque(maxlen=10)
-last_wake_time = 0
+last_wake_time = float("-inf")
 WAKE_COOLDOWN = 3.0  # seconds between wake detections
 
-def amplify(audio_data, gain=1.5):  # Reduced gain
-    samples = np.frombuffer(audio_data, dtype=np.int16)
-    samples = np.clip(samples * gain, -32768, 32767).astype(np.int16)
-    return samples.tobytes()
+# Fast path (opt-in): wake as soon as the partial hypothesis holds the wake
+# word unchanged for WAKE_FAST_STABLE chunks, instead of waiting for Vosk to
+# finalize the utterance. The final-result path stays the conservative mode.
+FAST_WAKE = os.getenv("WAKE_FAST") == "1"
+FAST_STABLE_PARTIALS = int(os.getenv("WAKE_FAST_STABLE") or 2)
+
+# Wake word seen in the latest partials: its (start, end) and for how many chunks
+stable_partial = None
+stable_partials = 0
+
+# Voice activity gate: keeps Vosk idle while the room is quiet
+SAMPLE_RATE = 16000
+CHUNK_BYTES = 4096  # read from arecord at a time: 2048 samples, 128 ms
+VAD_ENABLED = os.getenv("WAKE_VAD", "1") != "0"
+VAD_FRAME = 512  # samples (32 ms) per energy/ZCR frame
+VAD_MARGIN_DB = 10.0  # speech is this much louder than the noise floor
+VAD_ZCR_MIN = 0.25  # zero-crossing rate of fricatives, accepted at half the margin
+VAD_MIN_FLOOR_DB = -70.0  # dBFS; keeps digital silence from making the gate hair-trigger
+VAD_PREROLL = 0.4  # seconds replayed into the recognizer when the gate opens
+VAD_HANGOVER = 1.0  # seconds the gate stays open after speech, so Vosk can endpoint
+
+class VoiceGate:
+    """Energy/zero-crossing voice activity gate with a pre-roll ring buffer.
+
+    Chunks are split into VAD_FRAME-sample frames. A frame is speech when
+    its energy is VAD_MARGIN_DB above the tracked noise floor, or half that
+    with a fricative-like zero-crossing rate. While closed, chunks only go
+    into the pre-roll ring; when speech starts the ring is replayed so the
+    start of "apollo" is not clipped.
+    """
+
+    def __init__(self, chunk_seconds=CHUNK_BYTES / 2 / SAMPLE_RATE):
+        self.preroll = deque(maxlen=max(1, round(VAD_PREROLL / chunk_seconds)))
+        self.noise_floor = None
+        self.is_open = False
+        self.silent_for = 0.0
+
+    def reset(self):
+        """Close the gate and forget the pre-roll (the noise floor is kept)"""
+        self.preroll.clear()
+        self.is_open = False
+        self.silent_for = 0.0
+
+    def _speech_frames(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        frames = samples[:len(samples) // VAD_FRAME * VAD_FRAME].reshape(-1, VAD_FRAME)
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+
+        floats = frames.astype(np.float32) / 32768.0
+        energy = 10 * np.log10(np.mean(floats * floats, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / VAD_FRAME
+
+        if self.noise_floor is None:
+            self.noise_floor = max(float(energy.min()), VAD_MIN_FLOOR_DB)
+        margin = energy - self.noise_floor
+        speech = (margin > VAD_MARGIN_DB) | ((margin > VAD_MARGIN_DB / 2) & (zcr > VAD_ZCR_MIN))
+
+        # Track the floor: fall fast, rise slowly on noise and very slowly
+        # during speech, so a noise source that stays on is learned in time
+        for level, is_speech in zip(energy.tolist(), speech.tolist()):
+            if level < self.noise_floor:
+                rate = 0.5
+            else:
+                rate = 0.0005 if is_speech else 0.02
+            self.noise_floor = max(self.noise_floor + rate * (level - self.noise_floor), VAD_MIN_FLOOR_DB)
+
+        return speech
+
+    def process(self, item):
+        """Take a (capture time, chunk) item; return (items to decode, whether the gate just closed)"""
+        speech = self._speech_frames(item[1])
+        chunk_seconds = len(item[1]) / 2 / SAMPLE_RATE
+
+        if speech.any():
+            self.silent_for = 0.0
+            if not self.is_open:
+                self.is_open = True
+                stats["gate_opens"] += 1
+                items = list(self.preroll) + [item]
+                self.preroll.clear()
+                return items, False
+            return [item], False
+
+        if self.is_open:
+            self.silent_for += chunk_seconds
+            if self.silent_for < VAD_HANGOVER:
+                return [item], False
+            self.is_open = False
+            self.preroll.append(item)
+            return [], True
 
-def denoise(audio_data):
-    # samples = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32)
-    # # Less aggressive noise reduction
-    # reduced = nr.reduce_noise(y=samples, sr=16000, prop_decrease=0.8, stationary=False)
-    # return reduced.astype(np.int16).tobytes()
-    return audio_data # Skip denoising for now
+        self.preroll.append(item)
+        stats["chunks_gated"] += 1
+        return [], False
+
+gate = VoiceGate()
+
+# Capture hub: the audio read here is also served to other local consumers
+# (speech.js) so the microphone is only captured once
+AUDIO_SOCKET = os.getenv("WAKE_AUDIO_SOCKET")  # Unix socket path; unset = no hub
+AUDIO_DEVICE = os.getenv("WAKE_AUDIO_DEVICE") or "plug:shared_mic"
+HUB_HISTORY = 5.0  # seconds of captured audio kept for hand-offs
+HUB_CLIENT_BUFFER = 80  # chunks (~10 s) a slow client may fall behind before it is dropped
+HANDOFF_PREROLL = 0.3  # seconds before the end of the wake word handed to STT
+HANDOFF_MAX_AGE = 10.0  # seconds a wake boundary stays valid for a hand-off
+
+class AudioHub:
+    """Serves the captured audio to local clients over a Unix socket.
+
+    A client sends one line, LIVE for audio from now on or WAKE for audio
+    from HANDOFF_PREROLL before the end of the last wake word (falling back
+    to live audio without a recent one), then receives raw 16 kHz S16_LE
+    mono PCM until it disconnects. Every client is handed the same chunk
+    objects as the decoder, through its own queue and thread, so a slow
+    client cannot stall capture.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.history = deque()  # (captured_at, chunk)
+        self.clients = {}  # queue of a client -> its connection
+        self.wake_boundary = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.server.listen()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def publish(self, captured_at, chunk):
+        with self.lock:
+            self.history.append((captured_at, chunk))
+            while captured_at - self.history[0][0] > HUB_HISTORY:
+                self.history.popleft()
+            
+            for client in list(self.clients):
+                try:
+                    client.put_nowait(chunk)
+                except queue.Full:
+                    self._drop(client)
+                    print("Audio hub: dropping a client that fell behind", file=sys.stderr)
+
+    def _drop(self, client):
+        """Disconnect a client; called with the lock held"""
+        conn = self.clients.pop(client)
+        
+        # Its thread waits either for audio (woken by the None) or on a full
+        # socket (woken by the shutdown); both make it close the connection
+        while True:
+            try:
+                client.get_nowait()
+            except queue.Empty:
+                break
+        client.put_nowait(None)
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def mark_wake(self, boundary):
+        """Remember where the wake word ended (capture_clock() time)"""
+        with self.lock:
+            self.wake_boundary = boundary
+
+    def _accept(self):
+        while True:
+            conn, _ = self.server.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        client = None
+        try:
+            conn.settimeout(2)
+            request = conn.makefile('rb').readline().decode('ascii', 'replace').strip().upper()
+            conn.settimeout(None)
+            
+            with self.lock:
+                backlog = []
+                boundary = self.wake_boundary
+                if request == "WAKE" and boundary is not None and capture_clock() - boundary < HANDOFF_MAX_AGE:
+                    # Chunks are stamped when they finish, so keep those ending after the start
+                    start = boundary - HANDOFF_PREROLL
+                    backlog = [chunk for captured_at, chunk in self.history if captured_at > start]
+                    self.wake_boundary = None  # hand each wake over once
+                
+                client = queue.Queue(maxsize=len(backlog) + HUB_CLIENT_BUFFER)
+                for chunk in backlog:
+                    client.put_nowait(chunk)
+                self.clients[client] = conn
+            
+            while True:
+                chunk = client.get()
+                if chunk is None:
+                    break
+                conn.sendall(chunk)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.clients.pop(client, None)
+            conn.close()
+
+hub = AudioHub(AUDIO_SOCKET) if AUDIO_SOCKET else None
+
+# Streaming denoise/AGC (opt-in), run in its own thread between capture and
+# decoding. The hub still serves the unprocessed audio.
+DENOISE_ENABLED = os.getenv("WAKE_DENOISE") == "1"
+DENOISE_FRAME = 512  # samples per FFT frame; hop of half that (16 ms of latency)
+DENOISE_OVERSUBTRACT = 1.5  # scales the noise estimate in the gain rule
+DENOISE_FLOOR = 0.2  # minimum gain per bin, as prop_decrease=0.8 in noisereduce
+AGC_TARGET_DB = -20.0  # dBFS the AGC brings speech to
+AGC_MAX_GAIN = 8.0
+
+class Preprocessor:
+    """Streaming spectral-gating denoiser and AGC for fixed-size int16 chunks.
+
+    Frames of DENOISE_FRAME samples at 50% overlap are windowed with a
+    sqrt-Hann (analysis and synthesis), gated per frequency bin against a
+    noise profile updated on every chunk, and overlap-added back. The AGC
+    then moves towards the gain that brings voiced chunks to AGC_TARGET_DB,
+    lowering it at once and raising it gradually, and never past what the
+    chunk's peak allows without clipping. Buffers are allocated once.
+    """
+
+    def __init__(self, chunk_samples=CHUNK_BYTES // 2):
+        self.chunk_samples = chunk_samples
+        self.hop = DENOISE_FRAME // 2
+        frame_count = chunk_samples // self.hop
+        self.window = np.sqrt(np.hanning(DENOISE_FRAME + 1)[:-1]).astype(np.float32)
+        
+        # The last hop of the previous chunk followed by the current chunk,
+        # and a strided view of its overlapping frames
+        self.input = np.zeros(self.hop + chunk_samples, dtype=np.float32)
+        self.input_frames = np.lib.stride_tricks.sliding_window_view(self.input, DENOISE_FRAME)[::self.hop]
+        self.frames = np.empty((frame_count, DENOISE_FRAME), dtype=np.float32)
+        self.gains = np.empty((frame_count, DENOISE_FRAME // 2 + 1), dtype=np.float64)
+        self.overlap = np.zeros(self.hop, dtype=np.float32)
+        self.output = np.empty(chunk_samples, dtype=np.float32)
+        self.segments = self.output.reshape(frame_count, self.hop)
+        self.ramp = np.linspace(0, 1, chunk_samples, endpoint=False, dtype=np.float32)
+        self.pcm = np.empty(chunk_samples, dtype=np.int16)
+        
+        self.noise = None
+        self.voiced = False
+        self.gain = 1.0
+
+    def process(self, chunk):
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if len(samples) != self.chunk_samples:
+            return chunk  # short read at the end of the stream
+        
+        self.input[:self.hop] = self.input[-self.hop:]
+        np.multiply(samples, np.float32(1 / 32768), out=self.input[self.hop:])
+        np.multiply(self.input_frames, self.window, out=self.frames)
+        
+        spectrum = np.fft.rfft(self.frames, axis=1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        
+        # Chunks within 3 dB of the noise profile are taken as noise and
+        # adapt it quickly; louder ones only nudge it, so it still follows
+        # a noise floor that rises for good
+        level = power.mean(axis=0)
+        if self.noise is None:
+            self.noise = level
+        self.voiced = level.sum() > 2 * self.noise.sum()
+        self.noise += (0.02 if self.voiced else 0.3) * (level - self.noise)
+        
+        np.divide(self.noise, power + 1e-12, out=self.gains)
+        np.multiply(self.gains, -DENOISE_OVERSUBTRACT, out=self.gains)
+        self.gains += 1
+        np.clip(self.gains, DENOISE_FLOOR, 1, out=self.gains)
+        spectrum *= self.gains
+        
+        frames = np.fft.irfft(spectrum, n=DENOISE_FRAME, axis=1)
+        frames *= self.window
+        
+        # Overlap-add: each hop-long segment is the first half of its frame
+        # plus the second half of the frame before
+        self.segments[:] = frames[:, :self.hop]
+        self.segments[1:] += frames[:-1, self.hop:]
+        self.segments[0] += self.overlap
+        self.overlap[:] = frames[-1, self.hop:]
+        
+        self._apply_agc()
+        
+        np.multiply(self.output, 32767, out=self.output)
+        np.copyto(self.pcm, self.output, casting='unsafe')
+        return self.pcm.tobytes()
+
+    def _apply_agc(self):
+        level = 10 * np.log10(float(np.mean(self.output * self.output)) + 1e-10)
+        peak = float(np.abs(self.output).max())
+        
+        # Only level on chunks louder than the noise, so pauses between
+        # words are not boosted
+        target = self.gain
+        if self.voiced:
+            target = min(AGC_MAX_GAIN, 10 ** ((AGC_TARGET_DB - level) / 20))
+        if peak > 0:
+            target = min(target, 0.98 / peak)
+        
+        if target < self.gain:
+            # Attack at once so the chunk cannot clip
+            self.output *= target
+        else:
+            target = self.gain + 0.125 * (target - self.gain)
+            self.output *= self.gain + (target - self.gain) * self.ramp
+        self.gain = target
+
+preprocessor = Preprocessor() if DENOISE_ENABLED else None
+# Captured chunks waiting for the preprocessor, bounded like q
+raw_q = queue.Queue(maxsize=QUEUE_SIZE)
+
+# Audio fed to the recognizer as (recognizer time at its end, capture time
+# at its end, seconds), to place wake words on the capture clock. Vosk word
+# times count all audio fed since the recognizer was created.
+fed_chunks = deque(maxlen=100)
+stream_position = 0.0
+
+@contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    yield
+    startup[name] = round(time.perf_counter() - start, 3)
+
+def process_age():
+    """Seconds since this process started, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def load_model():
+    """Import Vosk, load the model and create the recognizer"""
+    global model, rec
+    
+    with startup_phase("import_vosk"):
+        from vosk import Model, KaldiRecognizer
+    
+    with startup_phase("model"):
+        if MODEL_PATH:
+            if not os.path.isdir(MODEL_PATH):
+                sys.exit(f"WAKE_MODEL_PATH is not a directory: {MODEL_PATH}")
+            model = Model(MODEL_PATH)
+        else:
+            model = Model(lang=MODEL_LANG)
+    
+    with startup_phase("recognizer"):
+        rec = KaldiRecognizer(model, SAMPLE_RATE, '["apollo", "[unk]"]')
+        rec.SetWords(True)
+        if FAST_WAKE:
+            try:
+                rec.SetPartialWords(True)
+            except AttributeError:
+                pass  # older Vosk: only the partial text is checked
+
+def warm_up():
+    """Decode a little silence so the first real chunk doesn't pay for a cold decoder"""
+    global stream_position
+    
+    silence = bytes(CHUNK_BYTES)
+    chunk_seconds = CHUNK_BYTES / 2 / SAMPLE_RATE
+    for _ in range(max(1, round(WARM_UP_SECONDS / chunk_seconds))):
+        rec.AcceptWaveform(silence)
+        # Word times keep counting the warm-up audio
+        stream_position += chunk_seconds
+    rec.Reset()
+
+def send(line):
+    """Write a protocol line (READY, WAKE, STATS ...) to stdout"""
+    with output_lock:
+        print(line)
+        sys.stdout.flush()
 
 def is_wake_word_valid(word_info):
     """Validate wake word detection with multiple criteria"""
@@ -72,7 +491,7 @@ def is_wake_word_valid(word_info):
 
 def check_wake_word_confirmation():
     """Check if we have enough confirmed detections in the time window"""
-    current_time = time.time()
+    current_time = wake_clock()
     
     # Remove old detections outside the window
     while recent_detections and current_time - recent_detections[0] > WAKE_CONFIRMATION_WINDOW:
@@ -81,11 +500,77 @@ def check_wake_word_confirmation():
     # Check if we have enough detections
     return len(recent_detections) >= WAKE_CONFIRMATION_COUNT
 
+def forget_partials():
+    global stable_partial, stable_partials
+    stable_partial = None
+    stable_partials = 0
+
+def capture_time_of(stream_time):
+    """Map a recognizer time to capture_clock() time, or None if it is not recent"""
+    for stream_end, captured_at, seconds in reversed(fed_chunks):
+        if stream_end - seconds <= stream_time <= stream_end:
+            return captured_at - (stream_end - stream_time)
+    return None
+
+def emit_wake(word_info=None):
+    # Mark the boundary first: the client may connect for the audio as soon
+    # as it sees WAKE
+    if hub:
+        boundary = capture_time_of(word_info['end']) if word_info and 'end' in word_info else None
+        hub.mark_wake(boundary if boundary is not None else last_captured_at)
+    
+    send("WAKE")
+    stats["wakes"] += 1
+    if last_captured_at is not None:
+        wake_latencies.append(capture_clock() - last_captured_at)
+
+def process_partial_result(partial):
+    """Fast path: fire on a wake word that stays put in the partial hypothesis.
+
+    With partial words the word must keep the same start and end times (it
+    has ended and the decoder moved on) for FAST_STABLE_PARTIALS chunks and
+    pass is_wake_word_valid; partial words may lack a confidence, in which
+    case stability stands in for it. Without partial words the wake word
+    just has to stay in the partial text.
+    """
+    global last_wake_time, stable_partial, stable_partials
+    
+    current_time = wake_clock()
+    if current_time - last_wake_time < WAKE_COOLDOWN:
+        return False
+    
+    if 'partial_result' in partial:
+        seen = next(
+            ((word_info.get('start'), word_info.get('end'))
+             for word_info in partial['partial_result']
+             if is_wake_word_valid(dict(word_info, conf=word_info.get('conf', 1.0)))),
+            None
+        )
+    else:
+        words = partial.get('partial', '').lower().split()
+        seen = 'text' if any(w.lower() in words for w in wake_words) else None
+    
+    if seen is None or seen != stable_partial:
+        stable_partial = seen
+        stable_partials = 1 if seen is not None else 0
+        return False
+    
+    stable_partials += 1
+    if stable_partials < FAST_STABLE_PARTIALS:
+        return False
+    
+    emit_wake({'end': seen[1]} if isinstance(seen, tuple) and seen[1] is not None else None)
+    # The cooldown keeps the final result of this utterance from waking again
+    last_wake_time = current_time
+    recent_detections.clear()
+    forget_partials()
+    return True
+
 def process_final_result(result):
     """Process final recognition result with word-level analysis"""
     global last_wake_time
     
-    current_time = time.time()
+    current_time = wake_clock()
     
     # Check cooldown period
     if current_time - last_wake_time < WAKE_COOLDOWN:
@@ -99,8 +584,7 @@ def process_final_result(result):
             recent_detections.append(current_time)
             wake_detected = True
             # print(f"Valid wake word detected: {word_info['word']} (conf: {word_info['conf']:.3f})")
-            print("WAKE")
-            sys.stdout.flush()
+            emit_wake(word_info)
             break
     
     # Check for confirmation
@@ -111,20 +595,176 @@ def process_final_result(result):
     
     return False
 
-def callback(indata, frames, time, status):
-    if status:
-        print(status, file=sys.stderr)
-    raw = bytes(indata)
-    processed = amplify(raw)
-    processed = denoise(processed)
-    q.put(processed)
+def captured(data):
+    """Route a chunk fresh from the microphone to the hub and towards the decoder"""
+    captured_at = capture_clock()
+    # The hub keeps serving audio (e.g. to STT) while decoding is paused
+    if hub:
+        hub.publish(captured_at, data)
+
+    # Keep draining the microphone while paused, but don't queue the audio
+    if paused.is_set():
+        stats["chunks_dropped"] += 1
+        return
+
+    enqueue((captured_at, data), raw_q if preprocessor else q)
+
+def preprocess_thread():
+    """Denoise and level chunks on their way to the decoder, pipelined with it"""
+    while True:
+        captured_at, data = raw_q.get()
+        start = time.perf_counter()
+        processed = preprocessor.process(data)
+        stats["preprocess_seconds"] += time.perf_counter() - start
+        stats["preprocessed_seconds"] += len(data) / 2 / SAMPLE_RATE
+        enqueue((captured_at, processed))
+
+def reset_recognizer():
+    """Forget any partially decoded utterance and pending detections"""
+    rec.Reset()
+    gate.reset()
+    forget_partials()
+    recent_detections.clear()
+    processed_texts.clear()
+    stats["resets"] += 1
+
+def enqueue(item, into=q):
+    """Queue a captured chunk, applying QUEUE_POLICY when the queue is full"""
+    if QUEUE_POLICY == "block":
+        into.put(item)
+    else:
+        while True:
+            try:
+                into.put_nowait(item)
+                break
+            except queue.Full:
+                stats["chunks_overflowed"] += 1
+                if QUEUE_POLICY == "drop-newest":
+                    return
+                try:
+                    into.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    stats["queue_max"] = max(stats["queue_max"], into.qsize())
+
+def summarize(samples):
+    """Milliseconds summary of recent delays, or None before the first one"""
+    if not samples:
+        return None
+    
+    values = np.array(samples) * 1000
+    return {
+        "last": round(float(values[-1]), 1),
+        "p50": round(float(np.percentile(values, 50)), 1),
+        "p95": round(float(np.percentile(values, 95)), 1),
+        "max": round(float(values.max()), 1),
+    }
+
+def get_stats():
+    audio_seconds = stats["audio_seconds"]
+    return {
+        "paused": paused.is_set(),
+        "uptime": round(time.time() - started_at, 1),
+        "queue_depth": q.qsize(),
+        "queue_size": QUEUE_SIZE,
+        "queue_policy": QUEUE_POLICY,
+        **stats,
+        "decode_seconds": round(stats["decode_seconds"], 3),
+        "audio_seconds": round(audio_seconds, 1),
+        # Decode time per second of audio; above 1 the queue grows
+        "rtf": round(stats["decode_seconds"] / audio_seconds, 4) if audio_seconds else None,
+        "preprocess_rtf": round(stats["preprocess_seconds"] / stats["preprocessed_seconds"], 4)
+                          if stats["preprocessed_seconds"] else None,
+        "queue_lag_ms": summarize(queue_lags),
+        # From capturing the chunk that completed the utterance to printing WAKE
+        "wake_latency_ms": summarize(wake_latencies),
+    }
+
+def stats_thread():
+    while True:
+        time.sleep(STATS_INTERVAL)
+        send("STATS " + json.dumps(get_stats()))
+
+def control_thread():
+    """Read control commands from stdin, one per line.
+
+    PAUSE   stop decoding; audio is dropped until RESUME
+    RESUME  reset the recognizer and start decoding again
+    RESET   reset the recognizer without pausing
+    STATS   answer with "STATS {...json...}"
+
+    PAUSE, RESUME and RESET are handed to the decoding loop, so they take
+    effect in the order they came in and the recognizer is only touched
+    there.
+    """
+    for line in sys.stdin:
+        command = line.strip().upper()
+        if command in ("PAUSE", "RESUME", "RESET"):
+            commands.put(command)
+        elif command == "STATS":
+            send("STATS " + json.dumps(get_stats()))
+        elif command:
+            print(f"Unknown command: {command}", file=sys.stderr)
+
+def handle_command(command):
+    if command == "PAUSE":
+        paused.set()
+        return
+    
+    reset_recognizer()
+    if command == "RESUME":
+        paused.clear()
+
+def decode(captured_at, data):
+    """Feed one chunk to the recognizer and check finished utterances"""
+    global stream_position
+    
+    chunk_seconds = len(data) / 2 / SAMPLE_RATE
+    stream_position += chunk_seconds
+    fed_chunks.append((stream_position, captured_at, chunk_seconds))
+    
+    decode_start = time.perf_counter()
+    final = rec.AcceptWaveform(data)
+    stats["decode_seconds"] += time.perf_counter() - decode_start
+    stats["chunks_decoded"] += 1
+    stats["audio_seconds"] += chunk_seconds
+    
+    if final:
+        result = json.loads(rec.Result())
+            
+        # Only process final results for wake word detection
+        process_final_result(result)
+            
+        # Clear processed texts on final result
+        processed_texts.clear()
+        forget_partials()
+    elif FAST_WAKE:
+        # Partial results are only worth parsing for the fast path
+        process_partial_result(json.loads(rec.PartialResult()))
+
+def finish_utterance():
+    """Make the recognizer finalize what it has heard (the gate closed on silence)"""
+    process_final_result(json.loads(rec.FinalResult()))
+    processed_texts.clear()
+    forget_partials()
 
-print("READY")
+def process_chunk(captured_at, data):
+    """Run one captured chunk through the voice gate and the recognizer"""
+    if not VAD_ENABLED:
+        decode(captured_at, data)
+        return
+    
+    items, closed = gate.process((captured_at, data))
+    for item in items:
+        decode(*item)
+    if closed:
+        finish_utterance()
 
 def reader_thread():
     arecord_cmd = [
         'arecord',
-        '-D', 'plug:shared_mic',     # <- your dsnoop alias
+        '-D', AUDIO_DEVICE,     # <- your dsnoop alias (not needed with the hub)
         '-f', 'S16_LE',
         '-r', '16000',           # <- this was wrong in your pasted version (44000!)
         '-c', '1',               # <- try stereo instead of mono
@@ -133,30 +773,81 @@ def reader_thread():
 
     with subprocess.Popen(arecord_cmd, stdout=subprocess.PIPE) as proc:
         while True:
-            data = proc.stdout.read(4096)  # 2 bytes * 2 channels * 1024 frames
+            data = proc.stdout.read(CHUNK_BYTES)
             if not data:
                 break
 
-            q.put(data)
-
-# start reader in background
-threading.Thread(target=reader_thread, daemon=True).start()
+            captured(data)
 
-# main loop reads from queue
-while True:
-    data = q.get()
+def main():
+    global hub, last_captured_at
+    
+    # Standby: load and warm up, then wait for START before touching the
+    # microphone or the hub socket, so a supervisor can swap this process
+    # in for a crashed detector without waiting for the model
+    standby = "--standby" in sys.argv[1:]
+    
+    age = process_age()
+    if age is not None:
+        # Interpreter start and imports, up to here
+        startup["interpreter"] = round(age, 3)
+    
+    load_model()
+    with startup_phase("warm_up"):
+        warm_up()
+    
+    if standby:
+        send("WARM")
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                return  # the supervisor is gone
+            if line.strip().upper() == "START":
+                break
+    promoted_at = time.perf_counter()
+    
+    if hub:
+        with startup_phase("hub"):
+            try:
+                hub.start()
+            except OSError as e:
+                print(f"Audio hub disabled: {e}", file=sys.stderr)
+                hub = None
+    
+    report = {"phases": startup, "standby": standby}
+    if standby:
+        report["promoted_in"] = round(time.perf_counter() - promoted_at, 3)
+    elif age is not None:
+        report["ready_after"] = round(process_age(), 3)
+    send("STARTUP " + json.dumps(report))
+    send("READY")
+    
+    # start reader in background
+    threading.Thread(target=reader_thread, daemon=True).start()
+    threading.Thread(target=control_thread, daemon=True).start()
+    if preprocessor:
+        threading.Thread(target=preprocess_thread, daemon=True).start()
+    if STATS_INTERVAL > 0:
+        threading.Thread(target=stats_thread, daemon=True).start()
+    
+    # main loop reads from queue
+    while True:
+        while not commands.empty():
+            handle_command(commands.get())
         
-    if rec.AcceptWaveform(data):
-        result = json.loads(rec.Result())
-            
-        # Only process final results for wake word detection
-        process_final_result(result)
-            
-        # Clear processed texts on final result
-        processed_texts.clear()
-    else:
-        # Still get partial results but don't use them for wake detection
-        partial = json.loads(rec.PartialResult())
-        text = partial.get("partial", "")
-        # Optionally uncomment for debugging:
-        # print(f"Partial: {text}")
\ No newline at end of file
+        # Time out now and then so commands are handled while no audio comes in
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        last_captured_at = item[0]
+        
+        if paused.is_set():
+            stats["chunks_flushed"] += 1
+            continue
+        
+        queue_lags.append(capture_clock() - last_captured_at)
+        process_chunk(*item)
+
+if __name__ == "__main__":
+    main()
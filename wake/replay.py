@@ -0,0 +1,308 @@
+"""Offline replay of recordings through the wake detector, for accuracy and speed.
+
+    python3 wake/replay.py recording.wav [--labels recording.txt] [--output results.json]
+    arecord -f S16_LE -r 16000 -c 1 -t raw -d 600 | python3 wake/replay.py -
+
+Recordings (WAV or raw S16_LE, 16 kHz mono; "-" reads stdin) are fed chunk
+by chunk, as fast as they decode, through the same pipeline as the live
+detector in main.py: denoise/AGC, the voice gate, Vosk, is_wake_word_valid,
+confirmation and cooldown, with the confirmation window and cooldown run on
+audio time.
+
+Labels are one wake word per line, "start [end]" in seconds (Audacity label
+exports work as they are). A WAKE between a label's start and TOLERANCE
+seconds after its end is a hit; any other WAKE is a false wake. Without
+labels the whole recording counts as background audio.
+
+Results are written as JSON (to stdout unless --output is given) so runs with
+different MIN_CONFIDENCE, chunk size, VAD or denoise settings can be
+compared; a short summary goes to stderr.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import wave
+
+from typing import List, Optional, Tuple
+
+WAKE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_RATE = 16000
+TOLERANCE = 2.0  # seconds after a label's end a WAKE still counts; covers Vosk endpointing
+
+def read_audio(path: str) -> bytes:
+    """PCM of a WAV or raw recording, checked to be 16 kHz mono S16_LE"""
+    if path == '-':
+        data = sys.stdin.buffer.read()
+    else:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    if not data.startswith(b'RIFF'):
+        return data[:len(data) // 2 * 2]  # raw, as arecord -t raw writes it
+
+    with wave.open(io.BytesIO(data)) as wav:
+        if (wav.getframerate(), wav.getnchannels(), wav.getsampwidth()) != (SAMPLE_RATE, 1, 2):
+            sys.exit(f"{path}: need 16 kHz mono 16-bit audio, got {wav.getframerate()} Hz, "
+                     f"{wav.getnchannels()} channel(s), {wav.getsampwidth() * 8}-bit")
+        return wav.readframes(wav.getnframes())
+
+def read_labels(path: str) -> List[Tuple[float, float]]:
+    """(start, end) of every labeled wake word, sorted"""
+    labels = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            fields = line.split('#', 1)[0].split()
+            if not fields:
+                continue
+
+            start = float(fields[0])
+            try:
+                end = float(fields[1])
+            except (IndexError, ValueError):
+                end = start
+            labels.append((start, max(start, end)))
+    return sorted(labels)
+
+def percentiles(samples: List[float]) -> Optional[dict]:
+    """Milliseconds summary of durations given in seconds"""
+    if not samples:
+        return None
+
+    values = sorted(s * 1000 for s in samples)
+    summary = {'count': len(values), 'mean': round(sum(values) / len(values), 3)}
+    for p in (50, 90, 95, 99):
+        summary[f'p{p}'] = round(values[min(len(values) - 1, len(values) * p // 100)], 3)
+    summary['max'] = round(values[-1], 3)
+    return summary
+
+def score(wakes: List[float], labels: List[Tuple[float, float]], duration: float) -> dict:
+    """Match WAKE times against labels; each label is hit by its first WAKE"""
+    windows = [(start, end + TOLERANCE) for start, end in labels]
+    hit_by = [None] * len(labels)
+    false_wakes = []
+    duplicates = 0
+
+    for wake in wakes:
+        matches = [i for i, (start, end) in enumerate(windows) if start <= wake <= end]
+        if not matches:
+            false_wakes.append(wake)
+            continue
+
+        unmatched = [i for i in matches if hit_by[i] is None]
+        if unmatched:
+            hit_by[unmatched[0]] = wake
+        else:
+            duplicates += 1  # a second WAKE for the same wake word
+
+    # Background audio is everything outside the (merged) label windows
+    covered = 0.0
+    covered_to = 0.0
+    for start, end in windows:
+        start, end = max(start, covered_to), min(end, duration)
+        if end > start:
+            covered += end - start
+            covered_to = end
+    background_hours = max(0.0, duration - covered) / 3600
+
+    hits = [i for i, wake in enumerate(hit_by) if wake is not None]
+    return {
+        'labels': len(labels),
+        'hits': len(hits),
+        'misses': len(labels) - len(hits),
+        'hit_rate': round(len(hits) / len(labels), 4) if labels else None,
+        'missed_at': [labels[i][0] for i, wake in enumerate(hit_by) if wake is None],
+        'duplicate_wakes': duplicates,
+        'false_wakes': len(false_wakes),
+        'false_wakes_at': [round(wake, 2) for wake in false_wakes],
+        'background_hours': round(background_hours, 4),
+        'false_wakes_per_hour': round(len(false_wakes) / background_hours, 3) if background_hours else None,
+        # From the end of the labeled wake word to WAKE, in audio time
+        'detection_delay_ms': percentiles([hit_by[i] - labels[i][1] for i in hits]),
+    }
+
+def replay(detector, audio: bytes, chunk_bytes: int) -> dict:
+    """Feed audio through the detector's pipeline; return WAKE times and per-chunk timings"""
+    position = 0.0
+    wakes = []
+    chunk_latencies = []
+    preprocess_seconds = 0.0
+
+    def audio_clock():
+        return position
+
+    def on_line(line):
+        # WAKE lines are collected instead of printed, stamped with audio time
+        if line == "WAKE":
+            wakes.append(position)
+
+    detector.capture_clock = audio_clock
+    detector.wake_clock = audio_clock
+    detector.send = on_line
+    detector.hub = None
+
+    start = time.perf_counter()
+    for offset in range(0, len(audio), chunk_bytes):
+        data = audio[offset:offset + chunk_bytes]
+        position += len(data) / 2 / SAMPLE_RATE
+
+        chunk_start = time.perf_counter()
+        if detector.preprocessor:
+            data = detector.preprocessor.process(data)
+            preprocess_seconds += time.perf_counter() - chunk_start
+        detector.process_chunk(position, data)
+        chunk_latencies.append(time.perf_counter() - chunk_start)
+
+    # The end of the recording ends the last utterance, like the gate closing
+    detector.finish_utterance()
+    wall_seconds = time.perf_counter() - start
+
+    return {
+        'wakes': [round(wake, 2) for wake in wakes],
+        'wall_seconds': wall_seconds,
+        'preprocess_seconds': preprocess_seconds,
+        'chunk_latencies': chunk_latencies,
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=WAKE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def headline(report: dict) -> dict:
+    performance, accuracy = report['performance'], report['accuracy']
+    return {
+        'speed_x_realtime': performance['speed_x_realtime'],
+        'decode_rtf': performance['decode_rtf'],
+        'chunk_latency_p95_ms': (performance['chunk_latency_ms'] or {}).get('p95'),
+        'wakes': len(report['wakes']),
+        'hit_rate': accuracy['hit_rate'],
+        'false_wakes_per_hour': accuracy['false_wakes_per_hour'],
+    }
+
+def print_summary(report: dict, previous: Optional[dict]) -> None:
+    before = headline(previous) if previous else {}
+
+    for name, value in headline(report).items():
+        line = f"{name:24} {value}"
+        if name in before:
+            line += f"  (previous: {before[name]})"
+        print(line, file=sys.stderr)
+
+    for at in report['accuracy']['missed_at']:
+        print(f"missed wake word at {at:.2f} s", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recordings through the wake detector and score it")
+    parser.add_argument('source', help='WAV or raw S16_LE 16 kHz mono recording; - for stdin')
+    parser.add_argument('--labels', help='Wake word times, one "start [end]" in seconds per line')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='Previous JSON results to compare against')
+    parser.add_argument('--min-confidence', type=float, help='Override MIN_CONFIDENCE')
+    parser.add_argument('--chunk-bytes', type=int, help='Bytes fed per chunk (default: CHUNK_BYTES, as read from arecord)')
+    parser.add_argument('--vad', choices=['0', '1'], help='Voice gate on/off (default: WAKE_VAD)')
+    parser.add_argument('--denoise', choices=['0', '1'], help='Denoise/AGC on/off (default: WAKE_DENOISE)')
+    parser.add_argument('--fast', choices=['0', '1'], help='Fast partial-result path on/off (default: WAKE_FAST)')
+
+    args = parser.parse_args()
+
+    # main.py reads these when it is imported
+    for name, value in (('WAKE_VAD', args.vad), ('WAKE_DENOISE', args.denoise), ('WAKE_FAST', args.fast)):
+        if value is not None:
+            os.environ[name] = value
+
+    audio = read_audio(args.source)
+    labels = read_labels(args.labels) if args.labels else []
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+
+    sys.path.insert(0, WAKE_DIR)
+    import main as detector
+    detector.load_model()
+    detector.warm_up()
+
+    if args.min_confidence is not None:
+        detector.MIN_CONFIDENCE = args.min_confidence
+
+    chunk_bytes = args.chunk_bytes or detector.CHUNK_BYTES
+    # The denoiser works in hops of DENOISE_FRAME / 2 samples, i.e. DENOISE_FRAME bytes
+    step = detector.DENOISE_FRAME if detector.preprocessor else 2
+    if chunk_bytes <= 0 or chunk_bytes % step:
+        sys.exit(f"--chunk-bytes must be a positive multiple of {step}")
+    if chunk_bytes != detector.CHUNK_BYTES:
+        detector.CHUNK_BYTES = chunk_bytes
+        detector.gate = detector.VoiceGate(chunk_bytes / 2 / SAMPLE_RATE)
+        if detector.preprocessor:
+            detector.preprocessor = detector.Preprocessor(chunk_bytes // 2)
+
+    duration = len(audio) / 2 / SAMPLE_RATE
+    run = replay(detector, audio, chunk_bytes)
+    stats = detector.stats
+    decoded_seconds = stats['audio_seconds']
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'source': args.source,
+        'labels_file': args.labels,
+        'audio_seconds': round(duration, 3),
+        'config': {
+            'min_confidence': detector.MIN_CONFIDENCE,
+            'min_word_duration': detector.MIN_WORD_DURATION,
+            'confirmation_window': detector.WAKE_CONFIRMATION_WINDOW,
+            'confirmation_count': detector.WAKE_CONFIRMATION_COUNT,
+            'cooldown': detector.WAKE_COOLDOWN,
+            'chunk_bytes': chunk_bytes,
+            'vad': detector.VAD_ENABLED,
+            'denoise': detector.DENOISE_ENABLED,
+            'fast': detector.FAST_WAKE,
+            'fast_stable': detector.FAST_STABLE_PARTIALS,
+            'tolerance': TOLERANCE,
+        },
+        'performance': {
+            'startup': detector.startup,
+            'wall_seconds': round(run['wall_seconds'], 3),
+            'speed_x_realtime': round(duration / run['wall_seconds'], 1) if run['wall_seconds'] else None,
+            # Seconds of processing per second of audio; decode_rtf only
+            # counts the audio the voice gate let through
+            'rtf': round(run['wall_seconds'] / duration, 4) if duration else None,
+            'decode_rtf': round(stats['decode_seconds'] / decoded_seconds, 4) if decoded_seconds else None,
+            'preprocess_rtf': round(run['preprocess_seconds'] / duration, 4)
+                              if detector.preprocessor and duration else None,
+            # Wall time from handing a chunk over to being done with it
+            # (denoise, gate, and decoding of any pre-roll it released)
+            'chunk_latency_ms': percentiles(run['chunk_latencies']),
+            'chunks': len(run['chunk_latencies']),
+            'chunks_decoded': stats['chunks_decoded'],
+            'chunks_gated': stats['chunks_gated'],
+            'gate_opens': stats['gate_opens'],
+        },
+        'wakes': run['wakes'],
+        'accuracy': score(run['wakes'], labels, duration),
+    }
+
+    print_summary(report, previous)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()